@@ -45,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.deadline.DeadlineMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.db.routers.ReplicaMiddleware',
+    'core.profiling.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,14 +84,132 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.environ.get('DB_ENGINE',
+                                 'django.db.backends.postgresql'),
         'HOST': os.environ.get("DB_HOST"),
         'NAME': os.environ.get("DB_NAME"),
         'USER': os.environ.get("DB_USER"),
-        'PASSWORD': os.environ.get("DB_PASS")
+        'PASSWORD': os.environ.get("DB_PASS"),
+        # Seconds a connection is kept after a request, 0 closes it (or
+        # returns it to the pool with core.db.backends.postgresql_pool)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        # Only read by DB_ENGINE=core.db.backends.postgresql_pool
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'HEALTH_CHECK_INTERVAL': int(
+                os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 10)
+            ),
+        },
+    }
+}
+
+# Read replicas, a comma separated list of hosts (of files with SQLite)
+# each cloned from the default database as replica1, replica2...
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(
+        filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    _alias = 'replica%d' % _index
+    DATABASES[_alias] = dict(
+        DATABASES['default'],
+        TEST={'MIRROR': 'default'},
+        **{'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+           else 'HOST': _replica.strip()}
+    )
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# Safe requests to these URL namespaces read from the replicas, clients
+# read from the primary for REPLICA_PIN_SECONDS after a write
+REPLICA_NAMESPACES = ('user', 'recipe')
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_CACHE = 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# Users resolved by core.authentication.CachedTokenAuthentication.
+# 'local' keeps them in a per-process LRU, 'django' in the CACHES alias
+# (use it with a shared cache when several workers must see invalidations
+# immediately). Other workers cannot invalidate a 'local' store, so there a
+# deleted token or deactivated user is let in for LOCAL_TIMEOUT seconds.
+TOKEN_AUTH_CACHE = {
+    'BACKEND': os.environ.get('TOKEN_AUTH_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 300)),
+    'LOCAL_TIMEOUT': 5,
+}
+
+# Representations served by GET /api/user/me/, see user.cache. Writes
+# only reach other workers through a shared ('django') store.
+USER_ME_CACHE = {
+    'BACKEND': os.environ.get('USER_ME_CACHE_BACKEND', 'django'),
+    'ALIAS': 'default',
+    'MAX_SIZE': int(os.environ.get('USER_ME_CACHE_SIZE', 10000)),
+    'TIMEOUT': int(os.environ.get('USER_ME_CACHE_TIMEOUT', 300)),
+}
+
+# Cache alias holding the per-user data versions behind ETag and
+# Last-Modified. It must be shared by every worker, otherwise a worker that
+# missed a change would answer 304 with stale data; `manage.py check
+# --deploy` fails while it (or USER_ME_CACHE) is a LocMemCache.
+USER_VERSION_CACHE = 'default'
+
+# Deleted users are removed by core.deletion in a background thread,
+# CHUNK_SIZE tags or tokens per transaction with PAUSE seconds in between.
+# SYNC runs the deletion in the request instead.
+USER_DELETION = {
+    'CHUNK_SIZE': int(os.environ.get('USER_DELETION_CHUNK_SIZE', 1000)),
+    'PAUSE': float(os.environ.get('USER_DELETION_PAUSE', 0)),
+    'SYNC': False,
+}
+
+# Responses of requests sent with an Idempotency-Key header are kept this
+# long for retries (see core.idempotency), in a cache shared by the workers
+IDEMPOTENCY_CACHE = 'default'
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Seconds a retry waits on (409) the first request before running again
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Write last_login in batches from a per-process buffer (see
+# core.last_login) instead of saving the user on every login
+LAST_LOGIN_BUFFER = {
+    'ENABLED': os.environ.get('LAST_LOGIN_BUFFER', '') == '1',
+    'FLUSH_INTERVAL': int(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 10)),
+    'BATCH_SIZE': 500,
+}
+
+# Token bucket throttling, see core.throttling. Rates are
+# '<burst>/<period>' keyed by '<view throttle_scope>.<ip|user|login>'.
+# Buckets are per process with 'local', use 'django' to share them.
+THROTTLE_CACHE = {
+    'BACKEND': os.environ.get('THROTTLE_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_SIZE': int(os.environ.get('THROTTLE_CACHE_SIZE', 100000)),
+}
+THROTTLE_RATES = {
+    'create-user.ip': os.environ.get('THROTTLE_CREATE_USER_IP', '20/hour'),
+    'token.ip': os.environ.get('THROTTLE_TOKEN_IP', '60/min'),
+    'token.login': os.environ.get('THROTTLE_TOKEN_LOGIN', '10/min'),
+    'me.user': os.environ.get('THROTTLE_ME_USER', '300/min'),
+    'tags.user': os.environ.get('THROTTLE_TAGS_USER', '300/min'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -129,3 +251,77 @@ STATIC_URL = '/static/'
 
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Tags API
+
+# Rows per INSERT statement and largest array accepted by tags/bulk/
+TAG_BULK_CREATE_BATCH_SIZE = 500
+TAG_BULK_CREATE_MAX_ITEMS = 5000
+
+# Matches returned by ?prefix= searches, overridable up to the max by ?limit=
+TAG_SEARCH_DEFAULT_LIMIT = 20
+TAG_SEARCH_MAX_LIMIT = 100
+
+# Stream unpaginated tag lists (always, or only with ?stream=1), encoding
+# TAG_STREAM_CHUNK_SIZE rows at a time, gzipped for clients accepting it
+TAG_LIST_STREAMING = os.environ.get('TAG_LIST_STREAMING', '') == '1'
+TAG_STREAM_CHUNK_SIZE = 2000
+TAG_STREAM_GZIP = True
+
+# Changes looked up this many seconds before a ?since= sync token, to catch
+# the writes committed late or stamped by a server with a late clock
+TAG_SYNC_OVERLAP = 5
+
+
+# Batch endpoint (api/batch/): sub-requests per batch and the URL
+# namespaces they may call
+BATCH_MAX_REQUESTS = 20
+BATCH_NAMESPACES = ('user', 'recipe')
+
+
+# Request deadlines, see core.deadline. Requests to NAMESPACES get ROUTES
+# [view name] (or DEFAULT) seconds from the X-Request-Start header of the
+# proxy, the time left bounds the PostgreSQL statement_timeout. Requests
+# queued longer than MAX_QUEUE_TIME seconds or arriving while MAX_IN_FLIGHT
+# requests are served by the process are answered 503 (0 disables either).
+# STATEMENT_TIMEOUT is the one the server applies (seconds, 0 for none),
+# longer budgets leave it alone.
+REQUEST_DEADLINE = {
+    'DEFAULT': float(os.environ.get('REQUEST_DEADLINE', 10)),
+    'ROUTES': {
+        'recipe:tag-bulk': 30,
+        # For all the calls of a batch
+        'batch:batch': 30,
+    },
+    'MAX_QUEUE_TIME': float(os.environ.get('REQUEST_MAX_QUEUE_TIME', 0)),
+    'MAX_IN_FLIGHT': int(os.environ.get('REQUEST_MAX_IN_FLIGHT', 0)),
+    'STATEMENT_TIMEOUT': float(os.environ.get('DB_STATEMENT_TIMEOUT', 0)),
+    'RETRY_AFTER': 1,
+    'NAMESPACES': ('user', 'recipe', 'batch'),
+}
+
+
+# Metrics exposed on /metrics
+
+# URL namespaces whose requests are measured
+METRICS_NAMESPACES = ('user', 'recipe', 'batch')
+# Directory shared by the worker processes of a multi-process server,
+# each process dumps its totals there every METRICS_FLUSH_INTERVAL seconds
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+# Request profiling, see core.profiling. Disabled unless PROFILER_DIR is
+# set, then a SAMPLE_RATE share of the requests (and requests sending a
+# header from `manage.py profile_report --sign`) are profiled there,
+# keeping the MAX_PROFILES most recent ones
+PROFILER = {
+    'DIR': os.environ.get('PROFILER_DIR'),
+    'SAMPLE_RATE': float(os.environ.get('PROFILER_SAMPLE_RATE', 0)),
+    'MAX_PROFILES': int(os.environ.get('PROFILER_MAX_PROFILES', 1000)),
+    'HEADER': 'X-Profile',
+    'HEADER_MAX_AGE': 3600,
+}
@@ -16,8 +16,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core import views as core_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('api/batch/', include(([
+        path('', core_views.BatchView.as_view(), name='batch'),
+    ], 'batch'))),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
 ]
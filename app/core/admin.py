@@ -3,6 +3,9 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from core import models
 from django.utils.translation import gettext as _
 
+from core.deletion import request_user_deletion
+from user.cache import invalidate_me
+
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
@@ -23,6 +26,31 @@ class UserAdmin(BaseUserAdmin):
 
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_me([obj.pk])
+
+    def get_deleted_objects(self, objs, request):
+        """Don't collect every related row for the confirmation page"""
+        objs = list(objs)
+        return ([str(obj) for obj in objs],
+                {self.opts.verbose_name_plural: len(objs)}, set(), [])
+
+    def delete_model(self, request, obj):
+        """Deactivate now, tags and tokens are deleted in the background"""
+        request_user_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            request_user_deletion(user)
+
+
+class UserDeletionAdmin(admin.ModelAdmin):
+    list_display = ['user_id', 'requested_at', 'finished_at',
+                    'tokens_deleted', 'tags_deleted', 'error']
+    readonly_fields = list_display + ['started_at']
+
 
 admin.site.register(models.User , UserAdmin)
-admin.site.register(models.Tag)
\ No newline at end of file
+admin.site.register(models.Tag)
+admin.site.register(models.UserDeletion, UserDeletionAdmin)
\ No newline at end of file
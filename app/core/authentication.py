@@ -0,0 +1,56 @@
+import copy
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import build_store
+from core.db.routers import primary_reads
+
+_store = None
+
+
+def get_token_store():
+    """Return the store holding resolved (user, token) pairs"""
+    global _store
+    if _store is None:
+        _store = build_store(settings.TOKEN_AUTH_CACHE,
+                             key_prefix='auth-token:')
+    return _store
+
+
+def invalidate_tokens(keys):
+    """Forget the cached users for the given token keys"""
+    keys = list(keys)
+    if keys:
+        get_token_store().delete_many(keys)
+
+
+@receiver(setting_changed)
+def reset_token_store(**kwargs):
+    global _store
+    if kwargs['setting'] == 'TOKEN_AUTH_CACHE':
+        _store = None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication remembering the resolved user so repeated calls
+    with the same token skip the Token + User query
+    """
+
+    def authenticate_credentials(self, key):
+        store = get_token_store()
+        cached = store.get(key)
+        if cached is not None:
+            user, token = cached
+            # Views may modify request.user, never hand out the stored one
+            return copy.copy(user), token
+
+        # Cached for every request with this token, /me/ included: a
+        # replica could still return a deactivated user
+        with primary_reads():
+            user, token = super().authenticate_credentials(key)
+        store.set(key, (user, token))
+        return copy.copy(user), token
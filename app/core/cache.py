@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class LocalLRUCache:
+    """
+    Bounded in-process store evicting the least recently used entries,
+    every entry expires after `timeout` seconds
+    """
+
+    def __init__(self, max_size=1024, timeout=300):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value stored for key or default when missing/expired"""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value for key, evicting the oldest entries when full"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheStore:
+    """
+    Store backed by one of the aliases configured in settings.CACHES,
+    shared between every worker using the same cache server
+    """
+
+    def __init__(self, alias='default', timeout=300, key_prefix=''):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return '%s%s' % (self.key_prefix, key)
+
+    def get(self, key, default=None):
+        return self.cache.get(self.make_key(key), default)
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        self.cache.set(self.make_key(key), value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def delete_many(self, keys):
+        self.cache.delete_many([self.make_key(key) for key in keys])
+
+    def clear(self):
+        """Entries are shared with other users of the alias, let them expire"""
+
+
+def build_store(config, key_prefix=''):
+    """
+    Build a store from a settings dictionary:
+    :param config: (dict) BACKEND ('local' or 'django'), ALIAS, MAX_SIZE,
+                   TIMEOUT and LOCAL_TIMEOUT, a shorter TIMEOUT for 'local'
+                   stores since other workers cannot invalidate them
+    :param key_prefix: (str) namespace for keys in a shared Django cache
+    :return: LocalLRUCache or DjangoCacheStore
+    """
+    backend = config.get('BACKEND', 'local')
+    timeout = config.get('TIMEOUT', 300)
+    if backend == 'local':
+        return LocalLRUCache(max_size=config.get('MAX_SIZE', 1024),
+                             timeout=min(timeout, config.get('LOCAL_TIMEOUT',
+                                                             timeout)))
+    if backend == 'django':
+        return DjangoCacheStore(alias=config.get('ALIAS', 'default'),
+                                timeout=timeout,
+                                key_prefix=key_prefix)
+    raise ValueError("Unknown cache store backend %r" % backend)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def _is_per_process(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') == LOCMEM
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    The ETag versions and the cached /me representations are only right
+    when every worker reads and invalidates the same cache
+    """
+    if settings.DEBUG:
+        return []
+    errors = []
+    if _is_per_process(settings.USER_VERSION_CACHE):
+        errors.append(Error(
+            'USER_VERSION_CACHE uses a per-process LocMemCache, workers that '
+            'miss a change answer 304 with stale data.',
+            hint='Point the alias to a cache shared by the workers '
+                 '(CACHE_BACKEND / CACHE_LOCATION).',
+            id='core.E001',
+        ))
+    me_cache = settings.USER_ME_CACHE
+    if me_cache.get('BACKEND') == 'local' or \
+            _is_per_process(me_cache.get('ALIAS', 'default')):
+        errors.append(Error(
+            'USER_ME_CACHE is not shared by the workers, they serve '
+            'outdated profiles after an update.',
+            hint="Use the 'django' backend with a cache shared by the "
+                 "workers.",
+            id='core.E002',
+        ))
+    return errors
@@ -0,0 +1,113 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, \
+                             quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+VERSION_KEY = 'user-version:%s'
+MODIFIED_KEY = 'user-modified:%s'
+
+
+def _cache():
+    return caches[settings.USER_VERSION_CACHE]
+
+
+def get_user_version(user_id):
+    """
+    Return the (version, last modified timestamp) of the user's data.
+    A missing counter restarts from the current time in microseconds so
+    ETags handed out before an eviction can never match again.
+    """
+    cache = _cache()
+    keys = (VERSION_KEY % user_id, MODIFIED_KEY % user_id)
+    values = cache.get_many(keys)
+    if keys[0] in values and keys[1] in values:
+        return values[keys[0]], values[keys[1]]
+
+    now = time.time()
+    cache.add(keys[0], int(now * 1000000), None)
+    cache.add(keys[1], now, None)
+    values = cache.get_many(keys)
+    return values.get(keys[0], 0), values.get(keys[1], now)
+
+
+def bump_user_version(user_id):
+    """
+    Mark the data served to the user as changed. Inside a transaction the
+    version is bumped again once it commits: a reader in between gets the
+    new version with the old rows, and that response must not stay valid.
+    """
+    _bump(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+def _bump(user_id):
+    cache = _cache()
+    key = VERSION_KEY % user_id
+    now = time.time()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(now * 1000000), None)
+    # Last-Modified has a one second resolution, make sure every change
+    # lands on a later second than the previous one
+    previous = cache.get(MODIFIED_KEY % user_id, 0)
+    cache.set(MODIFIED_KEY % user_id, max(now, int(previous) + 1), None)
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag / Last-Modified to GET responses from the per-user version
+    and answers matching conditional requests with 304 before the handler
+    runs any query or serializer
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.check_not_modified(request)
+
+    def get_validators(self, request):
+        """Return the (etag, last modified) of the response to request"""
+        version, modified = get_user_version(request.user.pk)
+        digest = hashlib.md5('\n'.join([
+            str(request.user.pk),
+            str(version),
+            request.get_full_path(),
+            request.accepted_media_type or '',
+        ]).encode()).hexdigest()
+        return quote_etag(digest), int(modified)
+
+    def check_not_modified(self, request):
+        etag, modified = self.get_validators(request)
+        self.headers['ETag'] = etag
+        self.headers['Last-Modified'] = http_date(modified)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if etag in etags or '*' in etags:
+                raise NotModified()
+            return
+
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE')
+        )
+        if since is not None and modified <= since:
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
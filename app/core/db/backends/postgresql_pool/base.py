@@ -0,0 +1,151 @@
+"""
+PostgreSQL backend checking connections out of a per-process pool instead
+of opening a new one for every request.
+
+Configure it with the POOL entry of the database settings:
+
+    'ENGINE': 'core.db.backends.postgresql_pool',
+    'POOL': {
+        'MIN_SIZE': 2,                # opened on first use and kept
+        'MAX_SIZE': 10,               # open connections per process
+        'MAX_LIFETIME': 3600,         # seconds before a connection is renewed
+        'TIMEOUT': 30,                # seconds to wait for a free connection
+        'HEALTH_CHECK_INTERVAL': 10,  # idle seconds before a SELECT 1
+    }
+
+Closing the Django connection (at the end of every request unless
+CONN_MAX_AGE keeps it) returns it to the pool.
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool, PoolExhausted
+from core.metrics import REGISTRY
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _check(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    # reset() left the connection out of autocommit, end the transaction
+    # the probe opened or set_session() refuses to run on checkout
+    conn.rollback()
+    return True
+
+
+def _reset(conn):
+    """Roll back and RESET ALL, refuse connections in an unknown state"""
+    if conn.closed:
+        return False
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status == extensions.TRANSACTION_STATUS_ACTIVE:
+        # A query is still running, never hand it out again
+        return False
+    conn.reset()
+    return True
+
+
+def get_pool(alias, conn_params, options):
+    """Return the pool of alias for those connection parameters"""
+    key = (alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                lambda: Database.connect(**conn_params),
+                min_size=options.get('MIN_SIZE', 0),
+                max_size=options.get('MAX_SIZE', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                timeout=options.get('TIMEOUT', 30),
+                check=_check,
+                check_interval=options.get('HEALTH_CHECK_INTERVAL', 10),
+                reset=_reset,
+            )
+        return pool
+
+
+def close_pools(database=None):
+    """Close the pools, or only those connected to the database name"""
+    with _pools_lock:
+        keys = [key for key in _pools
+                if database is None or ('database', database) in key[1]]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Return {(alias, database): stats} of every pool"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {(alias, dict(params).get('database')): pool.stats()
+            for (alias, params), pool in pools}
+
+
+def collect_pool_metrics():
+    stats = pool_stats()
+    gauges = ('size', 'idle', 'in_use')
+    for name in gauges:
+        yield ('db_pool_connections_%s' % name, 'gauge',
+               'Connections of the pool (%s)' % name.replace('_', ' '),
+               [((('alias', alias), ('database', database)), values[name])
+                for (alias, database), values in stats.items()])
+    counters = sorted({key for values in stats.values() for key in values} -
+                      set(gauges))
+    for name in counters:
+        yield ('db_pool_%s_total' % name, 'counter',
+               'Pool events (%s)' % name.replace('_', ' '),
+               [((('alias', alias), ('database', database)), values[name])
+                for (alias, database), values in stats.items()])
+
+
+REGISTRY.register_collector(collect_pool_metrics)
+
+
+class DatabaseCreation(base.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections would keep the test database in use
+        close_pools(database=test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params=None):
+        if conn_params is None:
+            conn_params = self.get_connection_params()
+        return get_pool(self.alias, conn_params,
+                        self.settings_dict.get('POOL') or {})
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        try:
+            connection = pool.getconn()
+        except PoolExhausted as exc:
+            raise Database.OperationalError(str(exc))
+        self._pool = pool
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.putconn(self.connection)
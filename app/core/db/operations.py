@@ -0,0 +1,157 @@
+"""
+Migration operations building and dropping indexes without blocking writes.
+
+On PostgreSQL AddIndexConcurrently runs CREATE INDEX CONCURRENTLY and
+RemoveIndexConcurrently DROP INDEX CONCURRENTLY, which cannot run inside
+a transaction, so the migration using them must set `atomic = False`:
+
+    class Migration(migrations.Migration):
+        atomic = False
+
+        operations = [
+            AddIndexConcurrently(
+                model_name='tag',
+                index=models.Index(fields=['user', 'name'], name='...'),
+            ),
+        ]
+
+A CREATE INDEX CONCURRENTLY that failed half way leaves an INVALID index
+behind, it is dropped before the index is built again so a failed
+migration can simply be rerun. Other backends use the regular operations.
+
+RunPostgreSQL is a RunSQL skipped by the other backends, for indexes only
+PostgreSQL has (or builds concurrently) written as SQL check_migrations
+can still read.
+"""
+from django.db.migrations.operations import AddIndex, RemoveIndex, RunSQL
+
+CREATE_INDEX_CONCURRENTLY = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS %(name)s ON %(table)s%(using)s '
+    '(%(columns)s)%(extra)s'
+)
+DROP_INDEX_CONCURRENTLY = 'DROP INDEX CONCURRENTLY IF EXISTS %s'
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+def _ensure_not_atomic(operation, schema_editor):
+    if schema_editor.atomic_migration:
+        raise ValueError(
+            'The %s operation cannot be executed inside a transaction, set '
+            'atomic = False on the Migration.' % operation.__class__.__name__
+        )
+
+
+def drop_invalid_index(schema_editor, name):
+    """Drop the index called name if a failed build left it INVALID"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = '
+            'pg_index.indexrelid WHERE pg_class.relname = %s AND NOT '
+            'pg_index.indisvalid', [name]
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute(
+            DROP_INDEX_CONCURRENTLY % schema_editor.quote_name(name)
+        )
+
+
+class AddIndexConcurrently(AddIndex):
+    """AddIndex without the write lock on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor,
+                                             from_state, to_state)
+        _ensure_not_atomic(self, schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias,
+                                        model):
+            return
+        drop_invalid_index(schema_editor, self.index.name)
+        fields = [model._meta.get_field(field_name)
+                  for field_name, _ in self.index.fields_orders]
+        schema_editor.execute(schema_editor._create_index_sql(
+            model, fields, name=self.index.name,
+            db_tablespace=self.index.db_tablespace,
+            col_suffixes=[order for _, order in self.index.fields_orders],
+            sql=CREATE_INDEX_CONCURRENTLY,
+        ))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_backwards(app_label, schema_editor,
+                                              from_state, to_state)
+        _ensure_not_atomic(self, schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(DROP_INDEX_CONCURRENTLY %
+                                  schema_editor.quote_name(self.index.name))
+
+    def describe(self):
+        return 'Concurrently create index %s on field(s) %s of model %s' % (
+            self.index.name, ', '.join(self.index.fields), self.model_name,
+        )
+
+
+class RemoveIndexConcurrently(RemoveIndex):
+    """RemoveIndex without the write lock on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor,
+                                             from_state, to_state)
+        _ensure_not_atomic(self, schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(DROP_INDEX_CONCURRENTLY %
+                                  schema_editor.quote_name(self.name))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_backwards(app_label, schema_editor,
+                                              from_state, to_state)
+        _ensure_not_atomic(self, schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias,
+                                        model):
+            return
+        index = to_state.models[app_label, self.model_name_lower] \
+            .get_index_by_name(self.name)
+        drop_invalid_index(schema_editor, index.name)
+        fields = [model._meta.get_field(field_name)
+                  for field_name, _ in index.fields_orders]
+        schema_editor.execute(schema_editor._create_index_sql(
+            model, fields, name=index.name,
+            db_tablespace=index.db_tablespace,
+            col_suffixes=[order for _, order in index.fields_orders],
+            sql=CREATE_INDEX_CONCURRENTLY,
+        ))
+
+    def describe(self):
+        return 'Concurrently remove index %s from %s' % (
+            self.name, self.model_name,
+        )
+
+
+class RunPostgreSQL(RunSQL):
+    """RunSQL on PostgreSQL, nothing on the other backends"""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if _is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state,
+                                      to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if _is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor,
+                                       from_state, to_state)
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of DB-API connections.
+
+    :param connect: (callable) opens a new connection
+    :param min_size: (int) connections opened up front and kept around
+    :param max_size: (int) upper bound of open connections
+    :param max_lifetime: (float) seconds after which a connection is
+                         replaced instead of being handed out again
+    :param timeout: (float) seconds to wait for a free connection
+    :param check: (callable) returns False for a connection that no longer
+                  works, run on checkout when it sat idle longer than
+                  check_interval seconds
+    :param reset: (callable) cleans up a returned connection, returns False
+                  when it must be discarded
+    """
+
+    def __init__(self, connect, min_size=0, max_size=10, max_lifetime=3600,
+                 timeout=30, check=None, check_interval=10, reset=None):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check = check
+        self.check_interval = check_interval
+        self.reset = reset
+        self.closed = False
+        self._cond = threading.Condition()
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        # (connection, opened at, returned at), the most recent last
+        self._idle = []
+        self._opened_at = {}
+        self._size = 0
+        self._filled = False
+        self.counters = dict.fromkeys((
+            'opened', 'closed', 'checkouts', 'reused', 'waits', 'timeouts',
+            'expired', 'check_failures',
+        ), 0)
+
+    def _after_fork(self):
+        """Connections of the parent process must not be shared"""
+        if self._pid != os.getpid():
+            self._init_state()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats.update(size=self._size, idle=len(self._idle),
+                         in_use=self._size - len(self._idle))
+        return stats
+
+    def getconn(self):
+        """Check out a connection, opening one if none is idle"""
+        if not self._filled:
+            self.fill()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                self._after_fork()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolExhausted(
+                            'No connection available within %s seconds '
+                            '(max_size=%d)' % (self.timeout, self.max_size)
+                        )
+                    self.counters['waits'] += 1
+                    self._cond.wait(remaining)
+                self.counters['checkouts'] += 1
+                if self._idle:
+                    conn, opened_at, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+
+            if conn is None:
+                return self._open()
+
+            now = time.monotonic()
+            if now - opened_at > self.max_lifetime:
+                self.counters['expired'] += 1
+                self._discard(conn)
+            elif self.check is not None and \
+                    now - returned_at > self.check_interval and \
+                    not self._safe_call(self.check, conn):
+                self.counters['check_failures'] += 1
+                self._discard(conn)
+            else:
+                self.counters['reused'] += 1
+                return conn
+
+    def putconn(self, conn, discard=False):
+        """Give a connection back to the pool"""
+        if self._pid != os.getpid():
+            # Opened by the parent process, leave its socket alone
+            return
+        opened_at = self._opened_at.get(id(conn))
+        if discard or self.closed or opened_at is None or \
+                time.monotonic() - opened_at > self.max_lifetime or \
+                (self.reset is not None and
+                 not self._safe_call(self.reset, conn)):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, opened_at, time.monotonic()))
+            self._cond.notify()
+
+    def fill(self):
+        """Open connections until min_size of them exist"""
+        self._filled = True
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            self.putconn(self._open())
+
+    def close(self):
+        """Close the idle connections, the others are closed on return"""
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def _open(self):
+        """Open a connection for a slot already counted in _size"""
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opened_at[id(conn)] = time.monotonic()
+            self.counters['opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            if self._opened_at.pop(id(conn), None) is not None:
+                self._size -= 1
+                self.counters['closed'] += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _safe_call(func, conn):
+        try:
+            return func(conn) is not False
+        except Exception:
+            return False
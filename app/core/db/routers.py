@@ -0,0 +1,125 @@
+"""
+Read replica routing.
+
+ReplicaRouter sends reads to one of settings.DATABASE_REPLICAS while the
+current thread is serving a request that ReplicaMiddleware marked as
+read only: a safe method routed to one of settings.REPLICA_NAMESPACES from
+a client that did not write recently. Everything else, writes and the
+reads of management commands, shells and tasks included, uses 'default'.
+
+After an unsafe request the client (its Authorization header, or its
+address when anonymous) is pinned to the primary for REPLICA_PIN_SECONDS,
+long enough for the replicas to catch up, so it always reads its writes.
+What other clients get from shared caches is read under primary_reads(),
+a lagging replica must not put stale rows there.
+"""
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+_state = threading.local()
+
+
+def replicas_enabled():
+    """Whether reads of the current thread may go to a replica"""
+    return getattr(_state, 'use_replicas', False)
+
+
+def set_replicas_enabled(enabled):
+    _state.use_replicas = enabled
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, whatever the request"""
+    enabled = replicas_enabled()
+    set_replicas_enabled(False)
+    try:
+        yield
+    finally:
+        set_replicas_enabled(enabled)
+
+
+@receiver(request_finished)
+def reset_replica_state(**kwargs):
+    # Streamed responses still read once the view returned, reset only
+    # after the last chunk was sent
+    set_replicas_enabled(False)
+
+
+class ReplicaRouter:
+    """Route reads to a random replica when the thread allows it"""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and replicas_enabled():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default'}.union(settings.DATABASE_REPLICAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def pin_keys(request):
+    """Return the cache keys that pin a client to the primary"""
+    keys = ['replica-pin:ip:%s' % request.META.get('REMOTE_ADDR', '')]
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        keys.append('replica-pin:auth:%s' % hashlib.sha256(
+            authorization.encode()
+        ).hexdigest())
+    return keys
+
+
+class ReplicaMiddleware:
+    """
+    Let ReplicaRouter read from replicas during safe requests to the
+    namespaces of settings.REPLICA_NAMESPACES, and pin clients to the
+    primary after their writes
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.namespaces = frozenset(settings.REPLICA_NAMESPACES)
+
+    @property
+    def cache(self):
+        return caches[settings.REPLICA_PIN_CACHE]
+
+    def __call__(self, request):
+        set_replicas_enabled(False)
+        response = self.get_response(request)
+        if request.method not in self.safe_methods and \
+                settings.DATABASE_REPLICAS:
+            # The most specific key, the same client may log in next
+            self.cache.set(pin_keys(request)[-1], True,
+                           settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if request.method in self.safe_methods and \
+                settings.DATABASE_REPLICAS and \
+                match is not None and match.namespace in self.namespaces:
+            set_replicas_enabled(
+                not self.cache.get_many(pin_keys(request))
+            )
@@ -0,0 +1,219 @@
+"""
+Request deadlines and load shedding.
+
+Every request to the REQUEST_DEADLINE['NAMESPACES'] gets a time budget,
+REQUEST_DEADLINE['ROUTES'][view name] or the DEFAULT one, counted from the
+time the proxy received it (its X-Request-Start header) when known:
+
+- requests that waited in the queue longer than MAX_QUEUE_TIME, or for
+  their whole budget, and requests arriving while MAX_IN_FLIGHT requests
+  are being served by this process, are answered 503 with Retry-After
+  before the view runs;
+- on PostgreSQL the budget left at the first query becomes the
+  statement_timeout of the connection when it is shorter than the
+  STATEMENT_TIMEOUT of the server, a cancelled query answers 503 instead
+  of holding the worker.
+
+The timeout is only set back for connections kept by CONN_MAX_AGE, others
+are closed (or RESET by the pool) at the end of the request. Streamed
+responses set it back once closed, the queries reading their body keep it.
+The in-flight limit is per process, it only matters for threaded workers.
+"""
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from django.utils.translation import gettext as _
+
+from core.metrics import REGISTRY
+
+SHED = REGISTRY.counter(
+    'http_requests_shed_total', 'Requests answered 503 before running',
+    ('route', 'reason')
+)
+TIMEOUTS = REGISTRY.counter(
+    'db_statement_timeouts_total', 'Queries cancelled by the deadline',
+    ('route',)
+)
+
+QUERY_CANCELED = '57014'
+
+
+def is_statement_timeout(exc):
+    """Tell whether a database error is a query cancelled by PostgreSQL"""
+    return getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED
+
+
+def parse_request_start(value):
+    """
+    Return the epoch seconds of an X-Request-Start header, "t=<time>" in
+    seconds, milliseconds or microseconds, None when malformed
+    """
+    if not value:
+        return None
+    try:
+        start = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    for scale in (1e6, 1e3):
+        if start > time.time() * scale / 10:
+            return start / scale
+    return start
+
+
+class InFlight:
+    """Count of the requests being served by this process"""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.value += 1
+
+    def exit(self):
+        with self.lock:
+            self.value -= 1
+
+
+IN_FLIGHT = InFlight()
+
+
+class StatementTimeout:
+    """
+    execute_wrapper setting the time left to the deadline as the
+    statement_timeout of a connection before its first query
+    """
+
+    def __init__(self):
+        self.deadline = None
+        self.route = ''
+        self.applied = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.deadline is not None and not self.applied:
+            self.applied = True
+            left = self.deadline - time.monotonic()
+            # Calling the next wrapper directly skips this one
+            execute('SET statement_timeout = %s',
+                    [max(1, int(left * 1000))], False, context)
+        try:
+            return execute(sql, params, many, context)
+        except DatabaseError as exc:
+            if is_statement_timeout(exc):
+                TIMEOUTS.inc((self.route,))
+            raise
+
+
+class DeadlineMiddleware:
+    """Shed late or excess requests, time out the queries of the others"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = settings.REQUEST_DEADLINE
+        self.default = config.get('DEFAULT')
+        self.routes = config.get('ROUTES', {})
+        self.max_queue_time = config.get('MAX_QUEUE_TIME')
+        self.max_in_flight = config.get('MAX_IN_FLIGHT')
+        self.retry_after = config.get('RETRY_AFTER', 1)
+        self.namespaces = frozenset(config.get('NAMESPACES', ()))
+        # The server's own statement_timeout, 0 when there is none
+        self.server_timeout = config.get('STATEMENT_TIMEOUT', 0)
+        budgets = [budget for budget in
+                   [self.default] + list(self.routes.values()) if budget]
+        self.sets_timeouts = any(self.shortens_timeout(budget)
+                                 for budget in budgets)
+
+    def shortens_timeout(self, seconds):
+        return not self.server_timeout or seconds < self.server_timeout
+
+    def __call__(self, request):
+        request.received_at = time.monotonic()
+        timeouts = request.statement_timeouts = {}
+        IN_FLIGHT.enter()
+        streaming = False
+        try:
+            with ExitStack() as stack:
+                for alias in connections if self.sets_timeouts else ():
+                    if connections[alias].vendor == 'postgresql':
+                        timeouts[alias] = StatementTimeout()
+                        stack.enter_context(
+                            connections[alias].execute_wrapper(
+                                timeouts[alias]
+                            )
+                        )
+                response = self.get_response(request)
+            streaming = response.streaming
+        finally:
+            IN_FLIGHT.exit()
+            if not streaming:
+                self.reset(timeouts)
+        if streaming:
+            close = response.close
+
+            def close_and_reset():
+                try:
+                    self.reset(timeouts)
+                finally:
+                    close()
+            response.close = close_and_reset
+        return response
+
+    def reset(self, timeouts):
+        """Give the connections used by the request their timeout back"""
+        for alias, timeout in timeouts.items():
+            connection = connections[alias]
+            if not timeout.applied or connection.connection is None or \
+                    connection.settings_dict['CONN_MAX_AGE'] == 0:
+                # Not reused with this session state
+                continue
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET statement_timeout = DEFAULT')
+            except DatabaseError:
+                # Broken, it will not be reused
+                connection.close()
+
+    def get_budget(self, match):
+        return self.routes.get(match.view_name, self.default)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is None or match.namespace not in self.namespaces:
+            return None
+        budget = self.get_budget(match)
+
+        started = parse_request_start(
+            request.META.get('HTTP_X_REQUEST_START')
+        )
+        queued = max(0.0, time.time() - started) if started else 0.0
+        if (self.max_queue_time and queued > self.max_queue_time) or \
+                (budget and queued >= budget):
+            return self.shed(match, 'queue')
+        if self.max_in_flight and IN_FLIGHT.value > self.max_in_flight:
+            return self.shed(match, 'in_flight')
+
+        if budget and self.shortens_timeout(budget - queued):
+            for timeout in request.statement_timeouts.values():
+                timeout.deadline = request.received_at + budget - queued
+                timeout.route = match.view_name
+        return None
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DatabaseError) and \
+                is_statement_timeout(exception):
+            return self.unavailable(_('The request took too long'))
+        return None
+
+    def shed(self, match, reason):
+        SHED.inc((match.view_name, reason))
+        return self.unavailable(_('The server is busy, try again later'))
+
+    def unavailable(self, detail):
+        response = JsonResponse({'detail': detail}, status=503)
+        response['Retry-After'] = str(self.retry_after)
+        return response
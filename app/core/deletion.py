@@ -0,0 +1,135 @@
+"""
+Background deletion of users.
+
+Deleting a user through the ORM collects every tag and token in memory
+and removes them in one long transaction. request_user_deletion() instead
+deactivates the user right away and records a UserDeletion; once the
+transaction commits, a single background thread of this process deletes
+the tokens and tags settings.USER_DELETION['CHUNK_SIZE'] rows per
+transaction, then the user itself. Deletions interrupted by a restart are
+finished by `manage.py drain_deletions`.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_tokens
+from core.conditional import bump_user_version
+from core.models import Tag, UserDeletion
+from user.cache import invalidate_me
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='deletion')
+        return _executor
+
+
+def request_user_deletion(user):
+    """
+    Deactivate the user and schedule the deletion of its data
+    :return: (UserDeletion)
+    """
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=user.pk).update(is_active=False)
+        deletion, _ = UserDeletion.objects.get_or_create(user_id=user.pk)
+        keys = list(Token.objects.filter(user_id=user.pk)
+                    .values_list('key', flat=True))
+    user.is_active = False
+    # update() sends no signal, drop the cached active user by hand
+    invalidate_tokens(keys)
+    invalidate_me([user.pk])
+
+    if settings.USER_DELETION.get('SYNC'):
+        run_deletion(deletion.pk)
+    else:
+        transaction.on_commit(lambda: schedule_deletion(deletion.pk))
+    return deletion
+
+
+def schedule_deletion(deletion_id):
+    get_executor().submit(_run_in_background, deletion_id)
+
+
+def _run_in_background(deletion_id):
+    try:
+        run_deletion(deletion_id)
+    except Exception:
+        logger.exception('Deletion %s failed', deletion_id)
+    finally:
+        # This thread's connection would otherwise stay open
+        connection.close()
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """
+    Delete the rows chunk_size at a time, yield the counts once each
+    chunk is committed
+    """
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)
+                   [:chunk_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            count = queryset.model.objects.filter(pk__in=ids).delete()[0]
+        # The caller pauses here, without holding the locks of the chunk
+        yield count
+
+
+def run_deletion(deletion_id, progress=None):
+    """
+    Delete the tokens, tags and finally the user of a UserDeletion
+    :param progress: (callable) called with the UserDeletion after
+                     every chunk
+    """
+    deletion = UserDeletion.objects.get(pk=deletion_id)
+    if deletion.finished_at is not None:
+        return deletion
+    config = settings.USER_DELETION
+    chunk_size = config.get('CHUNK_SIZE', 1000)
+    pause = config.get('PAUSE', 0)
+    UserDeletion.objects.filter(pk=deletion.pk).update(
+        started_at=timezone.now(), error=''
+    )
+    try:
+        for model, field in ((Token, 'tokens_deleted'),
+                             (Tag, 'tags_deleted')):
+            rows = model.objects.filter(user_id=deletion.user_id)
+            for count in delete_in_chunks(rows, chunk_size):
+                UserDeletion.objects.filter(pk=deletion.pk).update(
+                    **{field: F(field) + count}
+                )
+                if progress is not None:
+                    deletion.refresh_from_db()
+                    progress(deletion)
+                if pause:
+                    # Leave room for the other writers of the table
+                    time.sleep(pause)
+        # Nothing big is left for the collector
+        get_user_model().objects.filter(pk=deletion.user_id).delete()
+    except Exception as exc:
+        UserDeletion.objects.filter(pk=deletion.pk).update(error=str(exc))
+        raise
+    UserDeletion.objects.filter(pk=deletion.pk).update(
+        finished_at=timezone.now()
+    )
+    bump_user_version(deletion.user_id)
+    deletion.refresh_from_db()
+    return deletion
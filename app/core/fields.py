@@ -0,0 +1,72 @@
+"""
+Sparse fieldsets: ?fields=id,name limits a response to these fields.
+
+The requested combination is parsed once per distinct value and the
+serializer rendering it is built once per combination, so the selection
+costs a dictionary lookup per request.
+"""
+from functools import lru_cache
+
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+
+
+@lru_cache(maxsize=256)
+def parse_fields(value, available):
+    """
+    Return the fields of available listed in value, in available's order
+    :param value: (str) comma separated field names
+    :param available: (tuple) the fields that can be selected
+    :return: (tuple)
+    """
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested.difference(available)
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: [
+            _('Unknown fields: %s') % ', '.join(sorted(unknown))
+        ]})
+    if not requested:
+        raise ValidationError({FIELDS_PARAM: [_('Expected field names')]})
+    return tuple(name for name in available if name in requested)
+
+
+@lru_cache(maxsize=64)
+def sparse_serializer(serializer_class, fields):
+    """Return a subclass of a ModelSerializer limited to fields"""
+    meta = type('Meta', (serializer_class.Meta,), {'fields': fields})
+    return type(serializer_class.__name__, (serializer_class,),
+                {'Meta': meta, '__module__': serializer_class.__module__})
+
+
+class SparseFieldsMixin:
+    """
+    View mixin reading ?fields= among the sparse_fields of the view. Input
+    is always validated by the full serializer, only output is trimmed.
+    """
+    sparse_fields = ()
+
+    def get_sparse_fields(self):
+        """Return the selected fields, None when the full set is wanted"""
+        value = self.request.query_params.get(FIELDS_PARAM)
+        if value is None:
+            return None
+        return parse_fields(value, self.sparse_fields)
+
+    def get_output_serializer(self, *args, **kwargs):
+        """Like get_serializer() with the selected fields only"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return self.get_serializer(*args, **kwargs)
+        kwargs['context'] = self.get_serializer_context()
+        return sparse_serializer(self.get_serializer_class(), fields)(
+            *args, **kwargs
+        )
+
+    def filter_representation(self, data):
+        """Trim an already rendered representation to the selection"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return data
+        return {name: data[name] for name in fields if name in data}
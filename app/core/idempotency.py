@@ -0,0 +1,88 @@
+"""
+Idempotency-Key support for unsafe API calls.
+
+The first request with a given key runs normally and its response is kept
+for IDEMPOTENCY_KEY_TTL seconds in the IDEMPOTENCY_CACHE alias, retries
+with the same key and payload get that response back without running the
+view again. Keys are scoped by user and path.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('A request with this Idempotency-Key is in progress')
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = 422
+    default_detail = _('This Idempotency-Key was used with another payload')
+    default_code = 'idempotency_key_mismatch'
+
+
+def payload_fingerprint(request):
+    return hashlib.sha256(json.dumps(
+        request.data, sort_keys=True, default=str
+    ).encode()).hexdigest()
+
+
+def idempotent(method):
+    """Decorate a view method to honour the Idempotency-Key header"""
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        cache_key = 'idempotency:%s' % hashlib.sha256('\n'.join([
+            str(request.user.pk), request.path, key,
+        ]).encode()).hexdigest()
+        fingerprint = payload_fingerprint(request)
+
+        # add() is atomic, only one of concurrent retries runs the view
+        if not cache.add(cache_key, {'fingerprint': fingerprint},
+                         settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    raise IdempotencyKeyMismatch()
+                if 'status' not in stored:
+                    raise IdempotencyKeyInUse()
+                response = Response(stored['data'], status=stored['status'])
+                response['Idempotent-Replayed'] = 'true'
+                return response
+            # Expired meanwhile, run the request under a new lock
+            cache.add(cache_key, {'fingerprint': fingerprint},
+                      settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+        try:
+            response = method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            # Let the client retry
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+
+    return wrapper
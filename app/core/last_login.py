@@ -0,0 +1,153 @@
+"""
+Write-behind last_login.
+
+With settings.LAST_LOGIN_BUFFER['ENABLED'] logins only record the time in
+a per-process buffer instead of saving the user. A background thread
+writes the buffered times every FLUSH_INTERVAL seconds with one UPDATE per
+BATCH_SIZE users, and the buffer is flushed once more at exit. The UPDATE
+never moves last_login backwards, so whichever worker flushes last the
+most recent login wins.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.db import connection
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """
+    Latest login time of every user since the last flush.
+
+    :param flush_interval: (float) seconds between background flushes,
+                           None to only flush when flush() is called
+    :param batch_size: (int) users written by each UPDATE
+    """
+
+    def __init__(self, flush_interval=10, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._pending = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def record(self, user_id, when=None):
+        """Remember a login of user_id, keeping the most recent one"""
+        when = when or timezone.now()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker, the parent flushes its own logins
+                self._init_state()
+            previous = self._pending.get(user_id)
+            if previous is None or when > previous:
+                self._pending[user_id] = when
+            if self._thread is None and self.flush_interval is not None:
+                self._start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write the buffered times, return how many users were updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = sorted(pending.items())
+        updated = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                updated += self.write(batch)
+            except Exception:
+                logger.exception('Could not write last_login of %d users',
+                                 len(items) - start)
+                self.restore(items[start:])
+                break
+        return updated
+
+    def write(self, batch):
+        """UPDATE last_login of (user_id, time) pairs unless it is newer"""
+        User = get_user_model()
+        newest = Case(
+            *[When(Q(pk=pk) & (Q(last_login__isnull=True) |
+                               Q(last_login__lt=when)),
+                   then=Value(when)) for pk, when in batch],
+            default=F('last_login'),
+            output_field=DateTimeField(),
+        )
+        return User.objects.filter(pk__in=[pk for pk, _ in batch]) \
+                           .update(last_login=newest)
+
+    def restore(self, items):
+        """Put back logins that could not be written"""
+        with self._lock:
+            for user_id, when in items:
+                previous = self._pending.get(user_id)
+                if previous is None or when > previous:
+                    self._pending[user_id] = when
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='last-login-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                # This thread's connection would otherwise stay open
+                connection.close()
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._pid == os.getpid():
+            self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the buffer of this process, created on first use"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            config = settings.LAST_LOGIN_BUFFER
+            _buffer = LastLoginBuffer(
+                flush_interval=config.get('FLUSH_INTERVAL', 10),
+                batch_size=config.get('BATCH_SIZE', 500),
+            )
+            atexit.register(_buffer.stop)
+        return _buffer
+
+
+def buffer_last_login(sender, user, **kwargs):
+    """user_logged_in receiver replacing django.contrib.auth's one"""
+    user.last_login = timezone.now()
+    get_buffer().record(user.pk, user.last_login)
+
+
+def record_last_login(sender, user, **kwargs):
+    """
+    user_logged_in receiver replacing django.contrib.auth's one, buffering
+    the login while LAST_LOGIN_BUFFER is enabled
+    """
+    if settings.LAST_LOGIN_BUFFER.get('ENABLED'):
+        buffer_last_login(sender, user, **kwargs)
+    else:
+        update_last_login(sender, user, **kwargs)
@@ -0,0 +1,289 @@
+import binascii
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, \
+                              setup_test_environment, \
+                              teardown_test_environment
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.middleware import QueryCounter
+from core.models import Tag
+
+SCENARIOS = ('create', 'token', 'me', 'tags-list', 'tags-create')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = max(0, int(round(fraction * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Aggregate (latency seconds, status, queries) samples of a scenario"""
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[1] >= 400),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'queries_per_request':
+            sum(sample[2] for sample in samples) / len(samples)
+            if samples else 0.0,
+    }
+
+
+def create_benchmark_database(keepdb=False):
+    """Create a throwaway database, returning the original name"""
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite' and \
+            not connection.settings_dict['TEST']['NAME']:
+        # An in-memory database cannot be written by several threads
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.gettempdir(), 'benchmark_api.sqlite3'
+        )
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb
+    )
+    return old_name
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compare two result sets, returning a message per regression:
+    p95 latency or queries per request above the baseline, or requests per
+    second below it, by more than the tolerance (a fraction)
+    """
+    regressions = []
+    for scenario, base in sorted(baseline.items()):
+        current = results.get(scenario)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append('%s: p95 %.1f ms > baseline %.1f ms' % (
+                scenario, current['p95_ms'], base['p95_ms']))
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append('%s: %.1f req/s < baseline %.1f req/s' % (
+                scenario, current['rps'], base['rps']))
+        if current['queries_per_request'] > \
+                base['queries_per_request'] + 0.01:
+            regressions.append('%s: %.2f queries/request > baseline %.2f' % (
+                scenario, current['queries_per_request'],
+                base['queries_per_request']))
+    return regressions
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure latency and throughput of the API endpoints
+    """
+    help = ('Seed users and tags in a throwaway database, drive the API '
+            'under concurrency and report latency percentiles, requests per '
+            'second and queries per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=100,
+                            help='Tags seeded per user')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Unmeasured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                            default=list(SCENARIOS))
+        parser.add_argument('--output', help='Write the results as JSON')
+        parser.add_argument('--baseline',
+                            help='JSON results to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative regression (default 0.2)')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database between runs')
+        parser.add_argument('--no-isolate', dest='isolate',
+                            action='store_false',
+                            help='Run against the current database instead '
+                                 'of a throwaway test database, deleting '
+                                 'the seeded users afterwards')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as fp:
+                baseline = json.load(fp)['results']
+
+        # Random so that seeded users are never an open door, and per run
+        # so that what it created can be told apart and deleted
+        self.run_id = binascii.hexlify(os.urandom(4)).decode()
+        self.password = binascii.hexlify(os.urandom(16)).decode()
+        if options['isolate']:
+            setup_test_environment(debug=False)
+            old_name = create_benchmark_database(options['keepdb'])
+        try:
+            users = self.seed(options['users'], options['tags'])
+            results = {}
+            # Every request comes from one address, rate limits would
+            # turn the run into a measure of 429s
+            with override_settings(THROTTLE_RATES={}):
+                for scenario in options['scenarios']:
+                    results[scenario] = self.run_scenario(
+                        scenario, users, options['requests'],
+                        options['warmup'], options['concurrency']
+                    )
+                    self.report(scenario, results[scenario])
+        finally:
+            if options['isolate']:
+                connection.creation.destroy_test_db(
+                    old_name, verbosity=0, keepdb=options['keepdb']
+                )
+                teardown_test_environment()
+            else:
+                self.cleanup()
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump({'meta': self.meta(options), 'results': results},
+                          fp, indent=2, sort_keys=True)
+
+        if baseline is not None:
+            regressions = find_regressions(results, baseline,
+                                           options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' +
+                                   '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions'))
+
+    def seed(self, user_count, tags_per_user):
+        """Create users with tokens and tags, return [(user, token key)]"""
+        User = get_user_model()
+        # Hash once, PBKDF2 for every seeded user would dominate the run
+        password = make_password(self.password)
+        User.objects.bulk_create(
+            User(email='bench-%s-%d@example.com' % (self.run_id, i),
+                 name='Bench', password=password)
+            for i in range(user_count)
+        )
+        users = list(User.objects.filter(
+            email__startswith='bench-%s-' % self.run_id
+        ))
+        Token.objects.bulk_create(
+            Token(key=binascii.hexlify(os.urandom(20)).decode(), user=user)
+            for user in users
+        )
+        Tag.objects.bulk_create(
+            (Tag(user=user, name='Tag %d' % i)
+             for user in users for i in range(tags_per_user)),
+            batch_size=500
+        )
+        tokens = dict(Token.objects.filter(user__in=users)
+                      .values_list('user_id', 'key'))
+        self.stdout.write('Seeded %d users with %d tags each' % (
+            len(users), tags_per_user))
+        return [(user, tokens[user.pk]) for user in users]
+
+    def cleanup(self):
+        """Delete the users of the run, their tokens and tags with them"""
+        deleted, _ = get_user_model().objects.filter(
+            email__startswith='bench-%s-' % self.run_id
+        ).delete()
+        self.stdout.write('Deleted %d benchmark rows' % deleted)
+
+    def make_request(self, scenario, user, token, sequence):
+        """Build the arguments of a request for the scenario"""
+        auth = {'HTTP_AUTHORIZATION': 'Token ' + token}
+        if scenario == 'create':
+            return 'post', reverse('user:create'), {
+                'email': 'bench-%s-new-%d@example.com' % (self.run_id,
+                                                          sequence),
+                'password': self.password,
+                'name': 'New',
+            }, {}
+        if scenario == 'token':
+            return 'post', reverse('user:token'), {
+                'email': user.email, 'password': self.password
+            }, {}
+        if scenario == 'me':
+            return 'get', reverse('user:me'), None, auth
+        if scenario == 'tags-list':
+            return 'get', reverse('recipe:tag-list'), None, auth
+        return 'post', reverse('recipe:tag-list'), {
+            'name': 'New tag %d' % sequence
+        }, auth
+
+    def run_scenario(self, scenario, users, requests, warmup, concurrency):
+        sequence = count()
+
+        def work(index):
+            client = Client()
+            user, token = users[index % len(users)]
+            method, path, data, extra = self.make_request(
+                scenario, user, token, next(sequence)
+            )
+            queries = QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                response = getattr(client, method)(path, data, **extra)
+            return (time.perf_counter() - start, response.status_code,
+                    queries.count)
+
+        def run(total):
+            if concurrency <= 1:
+                return [work(index) for index in range(total)]
+            indexes = iter(range(total))
+            samples = []
+
+            def worker():
+                try:
+                    for index in indexes:
+                        samples.append(work(index))
+                finally:
+                    # Every thread opened its own connections
+                    connections.close_all()
+
+            threads = [threading.Thread(target=worker)
+                       for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return samples
+
+        run(warmup)
+        start = time.perf_counter()
+        samples = run(requests)
+        return summarize(samples, time.perf_counter() - start)
+
+    def report(self, scenario, result):
+        self.stdout.write(
+            '%-12s %6d req %4d err %8.1f req/s  p50 %7.2f ms  '
+            'p95 %7.2f ms  p99 %7.2f ms  %5.2f queries/req' % (
+                scenario, result['requests'], result['errors'],
+                result['rps'], result['p50_ms'], result['p95_ms'],
+                result['p99_ms'], result['queries_per_request'],
+            )
+        )
+
+    def meta(self, options):
+        return {
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'users': options['users'],
+            'tags': options['tags'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'timestamp': time.time(),
+        }
@@ -0,0 +1,80 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, \
+                              teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_api import \
+    create_benchmark_database
+from core.models import Tag
+from core.renderers import FastJSONRenderer
+from recipe.serializers import TagSerializer, serialize_tag_rows
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the tag list serialization paths
+    """
+    help = ('Time the ListModelMixin path (TagSerializer + JSONRenderer) '
+            'against the (id, name) rows + FastJSONRenderer path')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per path, the best one is reported')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_name = create_benchmark_database(options['keepdb'])
+        try:
+            for size in options['sizes']:
+                self.compare(size, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            teardown_test_environment()
+
+    def model_path(self, queryset):
+        data = TagSerializer(queryset, many=True).data
+        return JSONRenderer().render(data)
+
+    def fast_path(self, queryset):
+        data = serialize_tag_rows(queryset.values_list('id', 'name'))
+        return FastJSONRenderer().render(data)
+
+    def best_of(self, func, queryset, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = func(queryset.all())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def compare(self, size, repeat):
+        user = get_user_model().objects.create_user(
+            'bench-%d@example.com' % size, 'benchpass'
+        )
+        Tag.objects.bulk_create(
+            (Tag(user=user, name='Tag %d' % i) for i in range(size)),
+            batch_size=500
+        )
+        queryset = Tag.objects.filter(user=user).order_by('-name', '-id')
+
+        model_time, model_body = self.best_of(self.model_path, queryset,
+                                              repeat)
+        fast_time, fast_body = self.best_of(self.fast_path, queryset, repeat)
+        if model_body != fast_body:
+            raise CommandError('Fast path output differs at %d tags' % size)
+
+        self.stdout.write(
+            '%7d tags  ListModelMixin %8.1f ms  fast path %8.1f ms  '
+            '%.1fx' % (size, model_time * 1000, fast_time * 1000,
+                       model_time / fast_time)
+        )
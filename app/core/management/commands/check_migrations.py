@@ -0,0 +1,140 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+from django.db.migrations.executor import MigrationExecutor
+
+from core.db.operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+ERROR = 'error'
+WARNING = 'warning'
+
+CREATE_INDEX = re.compile(r'\bCREATE\s+(UNIQUE\s+)?INDEX\b(?!\s+CONCURRENTLY)',
+                          re.IGNORECASE)
+CONCURRENTLY = re.compile(r'\bINDEX\s+CONCURRENTLY\b', re.IGNORECASE)
+
+
+def sql_statements(sql):
+    """The statements of a RunSQL argument as strings"""
+    if isinstance(sql, str):
+        return [sql]
+    return [item if isinstance(item, str) else item[0] for item in sql]
+
+
+def check_operation(operation, migration, new_models):
+    """
+    Yield (level, message) for an operation locking existing tables
+    :param new_models: (set) lowercase names of the models created by the
+                       migration, changing them does not block anyone
+    """
+    model_name = getattr(operation, 'model_name_lower', None) or \
+        getattr(operation, 'name_lower', None)
+    if isinstance(operation, migrations.CreateModel):
+        return
+    if isinstance(operation, migrations.SeparateDatabaseAndState):
+        # Only the database side touches the tables
+        for database_operation in operation.database_operations:
+            yield from check_operation(database_operation, migration,
+                                       new_models)
+        return
+    if model_name in new_models and not isinstance(
+            operation, (migrations.RunSQL, migrations.RunPython)):
+        return
+
+    if isinstance(operation, (AddIndexConcurrently,
+                              RemoveIndexConcurrently)):
+        if migration.atomic:
+            yield ERROR, 'needs atomic = False on the Migration'
+    elif isinstance(operation, migrations.AddIndex):
+        yield ERROR, ('builds the index while blocking writes, use '
+                      'core.db.operations.AddIndexConcurrently')
+    elif isinstance(operation, migrations.RemoveIndex):
+        yield ERROR, ('drops the index while blocking reads and writes, '
+                      'use core.db.operations.RemoveIndexConcurrently')
+    elif isinstance(operation, (migrations.AlterUniqueTogether,
+                                migrations.AlterIndexTogether)):
+        yield ERROR, ('builds an index while blocking writes, add it with '
+                      'AddIndexConcurrently (or a unique index built '
+                      'CONCURRENTLY) first')
+    elif isinstance(operation, migrations.AddField):
+        field = operation.field
+        if field.db_index or field.unique:
+            yield ERROR, ('indexes the new column while blocking writes, '
+                          'add it with db_index=False and index it with '
+                          'AddIndexConcurrently')
+        if not field.null and field.has_default():
+            yield WARNING, ('a NOT NULL column with a default rewrites the '
+                            'whole table on PostgreSQL < 11')
+    elif isinstance(operation, migrations.AlterField):
+        yield WARNING, ('changing a column may rewrite the table or build '
+                        'indexes while holding an exclusive lock')
+    elif isinstance(operation, migrations.RunSQL):
+        statements = sql_statements(operation.sql)
+        if any(CREATE_INDEX.search(sql) for sql in statements):
+            yield ERROR, 'CREATE INDEX without CONCURRENTLY blocks writes'
+        if migration.atomic and any(CONCURRENTLY.search(sql)
+                                    for sql in statements):
+            yield ERROR, 'needs atomic = False on the Migration'
+    elif isinstance(operation, migrations.RunPython):
+        yield WARNING, ('cannot be inspected, make sure it does not lock '
+                        'or rewrite large tables')
+
+
+def check_migration(migration):
+    """Return [(operation, level, message)] for a migration"""
+    new_models = {operation.name_lower for operation in migration.operations
+                  if isinstance(operation, migrations.CreateModel)}
+    return [(operation, level, message)
+            for operation in migration.operations
+            for level, message in check_operation(operation, migration,
+                                                  new_models)]
+
+
+class Command(BaseCommand):
+    """
+    Django command flagging migrations that would block a busy table
+    """
+    help = ('Report the operations of pending migrations that take locks '
+            'blocking reads or writes, or rewrite tables, on PostgreSQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='*',
+                            help='Only check these apps')
+        parser.add_argument('--all', action='store_true',
+                            help='Check applied migrations too')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--strict', action='store_true',
+                            help='Fail on warnings too')
+
+    def handle(self, *args, **options):
+        executor = MigrationExecutor(connections[options['database']])
+        if options['all']:
+            nodes = executor.loader.graph.nodes
+            selected = [nodes[key] for key in sorted(nodes)]
+        else:
+            plan = executor.migration_plan(
+                executor.loader.graph.leaf_nodes()
+            )
+            selected = [migration for migration, backwards in plan
+                        if not backwards]
+        if options['app_label']:
+            selected = [migration for migration in selected
+                        if migration.app_label in options['app_label']]
+
+        errors = warnings = 0
+        for migration in selected:
+            for operation, level, message in check_migration(migration):
+                if level == ERROR:
+                    errors += 1
+                else:
+                    warnings += 1
+                self.stdout.write('%s.%s: %s (%s): %s' % (
+                    migration.app_label, migration.name, level,
+                    operation.describe(), message,
+                ))
+
+        summary = '%d migrations checked, %d errors, %d warnings' % (
+            len(selected), errors, warnings)
+        if errors or (warnings and options['strict']):
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.deletion import run_deletion
+from core.models import UserDeletion
+
+
+class Command(BaseCommand):
+    """
+    Django command finishing the user deletions left pending
+    """
+    help = ('Run the unfinished user deletions (interrupted by a restart '
+            'or failed) in this process, reporting their progress')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Only this user id, may be '
+                                               'repeated')
+        parser.add_argument('--verbose-progress', action='store_true',
+                            help='Print a line after every chunk')
+
+    def handle(self, *args, **options):
+        pending = UserDeletion.objects.filter(finished_at__isnull=True) \
+                                      .order_by('requested_at')
+        if options['users']:
+            pending = pending.filter(user_id__in=options['users'])
+
+        failed = 0
+        for deletion in pending:
+            self.stdout.write('Deleting user %d' % deletion.user_id)
+            try:
+                deletion = run_deletion(
+                    deletion.pk,
+                    progress=self.progress
+                    if options['verbose_progress'] else None,
+                )
+            except Exception as exc:
+                failed += 1
+                self.stderr.write('User %d failed: %s' % (deletion.user_id,
+                                                          exc))
+                continue
+            self.stdout.write('  %d tokens, %d tags deleted' % (
+                deletion.tokens_deleted, deletion.tags_deleted))
+
+        if failed:
+            raise CommandError('%d deletions failed' % failed)
+        self.stdout.write(self.style.SUCCESS('No deletion pending'))
+
+    def progress(self, deletion):
+        self.stdout.write('  %d tokens, %d tags so far' % (
+            deletion.tokens_deleted, deletion.tags_deleted))
@@ -0,0 +1,93 @@
+import csv
+import gzip
+import io
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management.base import BaseCommand
+
+from core.models import Tag
+
+EXPORTS = {
+    'users': (lambda: get_user_model().objects.all(), 'id',
+              ('id', 'email', 'name', 'is_active', 'is_staff',
+               'last_login')),
+    'tags': (lambda: Tag.objects.alive(), 'user_id',
+             ('id', 'user_id', 'name')),
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command to stream users or tags into a JSONL or CSV file
+    """
+    help = ('Export users or tags with a server-side cursor so memory stays '
+            'constant whatever the table size')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default='jsonl')
+        parser.add_argument('--output', default='-',
+                            help='Destination file, "-" for stdout')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Compress the output')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the cursor at a time')
+        parser.add_argument('--min-user-id', type=int,
+                            help='Only export users (or their tags) with '
+                                 'an id from this value')
+        parser.add_argument('--max-user-id', type=int,
+                            help='... up to this value, inclusive')
+
+    def handle(self, *args, **options):
+        get_queryset, user_field, fields = EXPORTS[options['model']]
+        queryset = get_queryset().order_by('pk')
+        if options['min_user_id'] is not None:
+            queryset = queryset.filter(
+                **{user_field + '__gte': options['min_user_id']}
+            )
+        if options['max_user_id'] is not None:
+            queryset = queryset.filter(
+                **{user_field + '__lte': options['max_user_id']}
+            )
+        rows = queryset.values_list(*fields).iterator(
+            chunk_size=options['chunk_size']
+        )
+
+        target = sys.stdout.buffer if options['output'] == '-' else \
+            open(options['output'], 'wb')
+        binary = gzip.GzipFile(fileobj=target, mode='wb') \
+            if options['gzip'] else target
+        stream = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+        try:
+            count = self.write(stream, options['format'], fields, rows)
+        finally:
+            # Keep stdout open, GzipFile.close() writes the trailer only
+            stream.detach()
+            if binary is not target:
+                binary.close()
+            if target is sys.stdout.buffer:
+                target.flush()
+            else:
+                target.close()
+
+        self.stderr.write('Exported %d %s' % (count, options['model']))
+
+    def write(self, stream, fmt, fields, rows):
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+            return count
+
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            stream.write(encoder.encode(dict(zip(fields, row))))
+            stream.write('\n')
+            count += 1
+        return count
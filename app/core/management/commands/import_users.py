@@ -0,0 +1,163 @@
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+
+def _init_worker():
+    """Make sure Django is configured in spawned hashing processes"""
+    import django
+    django.setup()
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per input row"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    """
+    Django command to create users in bulk from a CSV or JSONL file
+    """
+    help = ('Stream users (email, password, name) from a CSV or JSON lines '
+            'file, hash the passwords in a process pool and insert them in '
+            'batches, skipping emails that already exist')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, "-" for stdin')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Hashing processes, 0 hashes in-process '
+                                 '(default: one per CPU)')
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Skip this many rows, to resume a run')
+        parser.add_argument('--report-duplicates', action='store_true',
+                            help='Print every skipped row')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or \
+            ('jsonl' if options['path'].endswith(('.jsonl', '.json'))
+             else 'csv')
+        stream = sys.stdin if options['path'] == '-' else \
+            open(options['path'], newline='', encoding='utf-8')
+        pool = None
+        if options['workers'] != 0:
+            pool = ProcessPoolExecutor(max_workers=options['workers'],
+                                       initializer=_init_worker)
+        try:
+            self.import_rows(
+                read_rows(stream, fmt), options['offset'],
+                options['batch_size'], pool, options['report_duplicates']
+            )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+    def import_rows(self, rows, offset, batch_size, pool,
+                    report_duplicates):
+        rows = islice(rows, offset, None)
+        position = offset
+        inserted = skipped = 0
+        start = time.monotonic()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            new, duplicates = self.prepare(batch, position)
+            if report_duplicates:
+                for row_number, email in duplicates:
+                    self.stderr.write('Row %d: skipped %s' % (
+                        row_number, email))
+            count = self.insert(new, pool)
+            inserted += count
+            skipped += len(batch) - count
+            position += len(batch)
+
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                '%d rows, %d inserted, %d skipped, %.0f rows/s '
+                '(resume with --offset %d)' % (
+                    position, inserted, skipped,
+                    (position - offset) / elapsed if elapsed else 0,
+                    position,
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d users, skipped %d' % (inserted, skipped)
+        ))
+
+    def prepare(self, batch, position):
+        """
+        Normalize the emails of a batch and drop invalid rows and emails
+        already taken, returning ([(email, password, name)], duplicates)
+        """
+        User = get_user_model()
+        duplicates = []
+        candidates = {}
+        for number, row in enumerate(batch, start=position + 1):
+            email = User.objects.normalize_email((row.get('email') or '')
+                                                 .strip())
+            if not email or email in candidates:
+                duplicates.append((number, email or '<missing email>'))
+                continue
+            candidates[email] = (number, row.get('password') or None,
+                                 row.get('name') or '')
+
+        existing = set(User.objects.filter(email__in=list(candidates))
+                       .values_list('email', flat=True))
+        new = []
+        for email, (number, password, name) in candidates.items():
+            if email in existing:
+                duplicates.append((number, email))
+            else:
+                new.append((email, password, name))
+        return new, sorted(duplicates)
+
+    def insert(self, new, pool):
+        """Hash the passwords and insert the users, return how many"""
+        if not new:
+            return 0
+        User = get_user_model()
+        passwords = [password for _, password, _ in new]
+        if pool is None:
+            hashes = list(map(make_password, passwords))
+        else:
+            hashes = list(pool.map(make_password, passwords,
+                                   chunksize=max(1, len(passwords) // 64)))
+        users = [User(email=email, name=name, password=hashed)
+                 for (email, _, name), hashed in zip(new, hashes)]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+        except IntegrityError:
+            # Someone else created some of these emails meanwhile
+            taken = set(User.objects.filter(
+                email__in=[user.email for user in users]
+            ).values_list('email', flat=True))
+            users = [user for user in users if user.email not in taken]
+            if not users:
+                return 0
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create(users)
+            except IntegrityError as exc:
+                raise CommandError('Could not insert batch: %s' % exc)
+        return len(users)
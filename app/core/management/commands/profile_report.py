@@ -0,0 +1,90 @@
+import glob
+import json
+import os
+import pstats
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import route_directory, sign_profile_header
+
+
+class Command(BaseCommand):
+    """
+    Django command aggregating the dumps of SamplingProfilerMiddleware
+    """
+    help = ('Merge the sampled request profiles into a report of the '
+            'hottest functions and SQL statements')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help='Profiles directory, PROFILER["DIR"] by '
+                                 'default')
+        parser.add_argument('--route', action='append', default=[],
+                            help='Only this view name, may be repeated')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--sort', default='cumulative',
+                            choices=('cumulative', 'tottime', 'ncalls'))
+        parser.add_argument('--sign', action='store_true',
+                            help='Print a value for the profiling header '
+                                 'and exit')
+
+    def handle(self, *args, **options):
+        if options['sign']:
+            self.stdout.write(sign_profile_header())
+            return
+
+        directory = options['dir'] or settings.PROFILER.get('DIR')
+        if not directory:
+            raise CommandError('No profiles directory, pass --dir')
+        routes = [route_directory(route) for route in options['route']] \
+            or ['*']
+        profiles = sorted(
+            path for route in routes
+            for path in glob.glob(os.path.join(directory, route, '*.prof'))
+        )
+        if not profiles:
+            raise CommandError('No profiles found in %s' % directory)
+
+        self.report_requests(profiles)
+        stats = pstats.Stats(*profiles, stream=self.stdout)
+        stats.strip_dirs().sort_stats(options['sort'])
+        stats.print_stats(options['top'])
+        self.report_queries(profiles, options['top'])
+
+    def load_sidecars(self, profiles):
+        for path in profiles:
+            sidecar = path[:-len('.prof')] + '.sql.json'
+            try:
+                with open(sidecar) as fp:
+                    yield json.load(fp)
+            except (OSError, ValueError):
+                continue
+
+    def report_requests(self, profiles):
+        durations = defaultdict(list)
+        for info in self.load_sidecars(profiles):
+            durations[(info['route'], info['method'])].append(
+                info['duration']
+            )
+        self.stdout.write('%-40s %8s %10s %10s' % ('route', 'requests',
+                                                   'mean ms', 'max ms'))
+        for (route, method), values in sorted(durations.items()):
+            self.stdout.write('%-40s %8d %10.1f %10.1f' % (
+                '%s %s' % (method, route), len(values),
+                sum(values) / len(values) * 1000, max(values) * 1000,
+            ))
+
+    def report_queries(self, profiles, top):
+        totals = defaultdict(lambda: [0, 0.0])
+        for info in self.load_sidecars(profiles):
+            for query in info['queries']:
+                total = totals[query['sql']]
+                total[0] += 1
+                total[1] += query['duration']
+        self.stdout.write('%8s %10s  %s' % ('calls', 'total ms', 'SQL'))
+        ranked = sorted(totals.items(), key=lambda item: -item[1][1])
+        for sql, (calls, duration) in ranked[:top]:
+            self.stdout.write('%8d %10.1f  %s' % (calls, duration * 1000,
+                                                  sql))
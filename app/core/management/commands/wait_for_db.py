@@ -1,22 +1,92 @@
 import time
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import  BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """
     Django command to pause execution until database is available
     """
+    help = 'Wait until the databases accept connections and answer queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--databases', nargs='+', default=[DEFAULT_DB_ALIAS],
+            help='Database aliases to wait for (default: "default")'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up after this many seconds overall'
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.1,
+            help='First delay between attempts, doubled after each failure'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound of the delay between attempts'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=0, metavar='N',
+            help='Open N connections per database and report their latency'
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write("Database unavailable, waiting 1 second...")
-                time.sleep(1)
+        deadline = time.monotonic() + options['timeout']
+        for alias in options['databases']:
+            self.wait_for(alias, deadline, options['initial_delay'],
+                          options['max_delay'])
+            if options['warmup'] > 0:
+                self.warm_up(alias, options['warmup'])
 
         self.stdout.write(self.style.SUCCESS('Database Available!'))
+
+    def ping(self, alias):
+        """Open a real connection and run a trivial query"""
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+    def wait_for(self, alias, deadline, delay, max_delay):
+        self.stdout.write('Waiting for database %s...' % alias)
+        while True:
+            try:
+                self.ping(alias)
+                return
+            except OperationalError as exc:
+                connections[alias].close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        'Database %s unavailable: %s' % (alias, exc)
+                    )
+                delay = min(delay, max_delay, remaining)
+                self.stdout.write(
+                    'Database unavailable, waiting %.1f seconds...' % delay
+                )
+                time.sleep(delay)
+                delay *= 2
+
+    def warm_up(self, alias, count):
+        """Open count connections to alias, report the connect latency"""
+        latencies = []
+        opened = []
+        try:
+            for _ in range(count):
+                conn = connections[alias].copy()
+                start = time.perf_counter()
+                conn.ensure_connection()
+                latencies.append((time.perf_counter() - start) * 1000)
+                opened.append(conn)
+        finally:
+            for conn in opened:
+                conn.close()
+
+        self.stdout.write(
+            'Warmed up %d connections to %s, connect latency '
+            'min %.1f ms / avg %.1f ms / max %.1f ms' % (
+                count, alias, min(latencies),
+                sum(latencies) / len(latencies), max(latencies)
+            )
+        )
@@ -0,0 +1,295 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    """Base class of the metrics held by a Registry"""
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def empty(self):
+        raise NotImplementedError
+
+    def merge(self, into, value):
+        raise NotImplementedError
+
+    def samples(self, labels, value):
+        raise NotImplementedError
+
+    def label_pairs(self, labels):
+        return tuple(zip(self.labelnames, labels))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def empty(self):
+        return 0
+
+    def merge(self, into, value):
+        return into + value
+
+    def samples(self, labels, value):
+        yield self.name, self.label_pairs(labels), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        # One slot per bucket plus +Inf, then sum and count
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def empty(self):
+        return [0] * (len(self.buckets) + 3)
+
+    def merge(self, into, value):
+        return [a + b for a, b in zip(into, value)]
+
+    def samples(self, labels, value):
+        pairs = self.label_pairs(labels)
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), value[:-2]):
+            cumulative += count
+            yield self.name + '_bucket', pairs + (('le', bound),), cumulative
+        yield self.name + '_sum', pairs, value[-2]
+        yield self.name + '_count', pairs, value[-1]
+
+
+class Registry:
+    """
+    Collects metrics without locks on the hot path: every thread writes
+    only to its own shard and shards are merged when the metrics are read.
+    The shards of finished threads are folded into one total when a new
+    thread starts writing or the metrics are read, so threads serving a
+    single connection do not pile up.
+
+    When settings.METRICS_MULTIPROC_DIR is set each process also dumps its
+    totals there every METRICS_FLUSH_INTERVAL seconds, and rendering merges
+    the dumps of every process.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        # [(thread, shard)] of the threads that recorded something
+        self._shards = []
+        # Totals of the threads that finished
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self._last_flush = time.monotonic()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=LATENCY_BUCKETS):
+        return self._register(
+            Histogram(self, name, documentation, labelnames, buckets)
+        )
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def register_collector(self, collector):
+        """
+        Add a callable returning extra (name, type, documentation, samples)
+        tuples read at render time, samples being (label pairs, value)
+        """
+        self._collectors.append(collector)
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _prune(self):
+        """Fold the shards of finished threads, they are not written to"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge(self._finished, shard)
+        self._shards = alive
+
+    def _merge(self, totals, shard):
+        for key, value in list(shard.items()):
+            metric = self._metrics[key[0]]
+            if isinstance(value, list):
+                value = list(value)
+            totals[key] = metric.merge(totals.get(key, metric.empty()), value)
+
+    def snapshot(self):
+        """Return the totals of this process as {(name, labels): value}"""
+        totals = {}
+        with self._lock:
+            self._prune()
+            self._merge(totals, self._finished)
+            for thread, shard in self._shards:
+                self._merge(totals, shard)
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._finished.clear()
+            for thread, shard in self._shards:
+                shard.clear()
+
+    def multiproc_dir(self):
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+    def dump_path(self, directory, pid=None):
+        return os.path.join(directory,
+                            'metrics-%d.json' % (pid or os.getpid()))
+
+    def flush(self):
+        """Write the totals of this process to the multiprocess directory"""
+        directory = self.multiproc_dir()
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        path = self.dump_path(directory)
+        tmp = '%s.%d.tmp' % (path, threading.get_ident())
+        data = [[name, list(labels), value]
+                for (name, labels), value in self.snapshot().items()]
+        with open(tmp, 'w') as fp:
+            json.dump(data, fp)
+        os.replace(tmp, path)
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if self.multiproc_dir() and \
+                time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def collect(self):
+        """Return the totals of every process"""
+        totals = self.snapshot()
+        directory = self.multiproc_dir()
+        if not directory or not os.path.isdir(directory):
+            return totals
+
+        own = self.dump_path(directory)
+        for entry in os.listdir(directory):
+            path = os.path.join(directory, entry)
+            if not entry.endswith('.json') or path == own:
+                continue
+            try:
+                with open(path) as fp:
+                    data = json.load(fp)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                key = (name, tuple(labels))
+                totals[key] = metric.merge(
+                    totals.get(key, metric.empty()), value
+                )
+        return totals
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        by_name = {}
+        for (name, labels), value in self.collect().items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append('# HELP %s %s' % (name, metric.documentation))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for labels, value in sorted(by_name.get(name, ()),
+                                        key=lambda item: item[0]):
+                for sample, sample_labels, sample_value in \
+                        metric.samples(labels, value):
+                    lines.append(_sample(sample, sample_labels, sample_value))
+
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append('# HELP %s %s' % (name, documentation))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for labels, value in samples:
+                    lines.append(_sample(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n') \
+                     .replace('"', r'\"')
+
+
+def _sample(name, labels, value):
+    if labels:
+        name = '%s{%s}' % (name, ','.join(
+            '%s="%s"' % (key, _escape(label)) for key, label in labels
+        ))
+    return '%s %s' % (name, repr(float(value)) if isinstance(value, float)
+                      else value)
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'Requests by route, method and status',
+    ('route', 'method', 'status')
+)
+LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time spent serving requests',
+    ('route', 'method')
+)
+RESPONSE_SIZE = REGISTRY.histogram(
+    'http_response_size_bytes', 'Size of the response bodies',
+    ('route', 'method'), buckets=SIZE_BUCKETS
+)
+QUERIES = REGISTRY.histogram(
+    'db_queries_per_request', 'SQL queries executed per request',
+    ('route', 'method'), buckets=QUERY_COUNT_BUCKETS
+)
+QUERY_TIME = REGISTRY.histogram(
+    'db_query_duration_seconds', 'Time spent in SQL per request',
+    ('route', 'method')
+)
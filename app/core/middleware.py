@@ -0,0 +1,57 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+
+
+class QueryCounter:
+    """execute_wrapper counting the queries of a request and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL usage, response size and status of the requests
+    routed to the namespaces listed in settings.METRICS_NAMESPACES
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.namespaces = frozenset(settings.METRICS_NAMESPACES)
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(queries)
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is not None and match.namespace in self.namespaces:
+            labels = (match.view_name, request.method)
+            metrics.LATENCY.observe(labels, duration)
+            metrics.QUERIES.observe(labels, queries.count)
+            metrics.QUERY_TIME.observe(labels, queries.duration)
+            if not response.streaming:
+                metrics.RESPONSE_SIZE.observe(labels, len(response.content))
+            metrics.REQUESTS.inc(labels + (str(response.status_code),))
+        metrics.REGISTRY.maybe_flush()
+        return response
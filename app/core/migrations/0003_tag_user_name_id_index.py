@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The index is built without locking the table
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_tag'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'],
+                               name='core_tag_user_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from core.db.operations import RunPostgreSQL
+
+INDEX_NAME = 'core_tag_user_upper_name_idx'
+
+
+class Migration(migrations.Migration):
+    """
+    Index the expression Django's istartswith lookup compares,
+    UPPER("name"::text) LIKE UPPER('prefix%'), text_pattern_ops lets LIKE
+    use it whatever the database collation is. Other backends go without.
+    """
+    # The index is built without locking the table
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_tag_user_name_id_index'),
+    ]
+
+    operations = [
+        RunPostgreSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON core_tag '
+            '(user_id, (UPPER(name::text)) text_pattern_ops)' % INDEX_NAME,
+            'DROP INDEX CONCURRENTLY IF EXISTS %s' % INDEX_NAME,
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def dedupe_tags(apps, schema_editor):
+    """Keep the oldest tag of every (user, name) before making it unique"""
+    Tag = apps.get_model('core', 'Tag')
+    db = schema_editor.connection.alias
+    duplicates = Tag.objects.using(db).values('user_id', 'name').annotate(
+        count=Count('id'), keep=Min('id'),
+    ).filter(count__gt=1).order_by()
+    for group in duplicates.iterator():
+        Tag.objects.using(db).filter(
+            user_id=group['user_id'], name=group['name'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tag_upper_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+from importlib import import_module
+
+from django.db import migrations
+
+from core.db.operations import RunPostgreSQL, drop_invalid_index
+
+dedupe_tags = import_module('core.migrations.0005_dedupe_tags').dedupe_tags
+
+INDEX_NAME = 'core_tag_user_id_name_uniq'
+
+
+def prepare_unique_index(apps, schema_editor):
+    """
+    Drop what a failed build left behind, then dedupe again: tags may have
+    been duplicated since 0005 ran in its own transaction
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        drop_invalid_index(schema_editor, INDEX_NAME)
+    dedupe_tags(apps, schema_editor)
+
+
+def add_unique_together(apps, schema_editor):
+    """Other backends have no concurrent build, alter the table"""
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.alter_unique_together(
+            apps.get_model('core', 'Tag'), [], [('user', 'name')]
+        )
+
+
+def remove_unique_together(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.alter_unique_together(
+            apps.get_model('core', 'Tag'), [('user', 'name')], []
+        )
+
+
+class Migration(migrations.Migration):
+    # The unique index is built without blocking writes, then only the
+    # short ADD CONSTRAINT ... USING INDEX locks the table
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_dedupe_tags'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(prepare_unique_index,
+                                     migrations.RunPython.noop),
+                RunPostgreSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS %s '
+                    'ON core_tag (user_id, name)' % INDEX_NAME,
+                    'DROP INDEX CONCURRENTLY IF EXISTS %s' % INDEX_NAME,
+                ),
+                RunPostgreSQL(
+                    'ALTER TABLE core_tag ADD CONSTRAINT %s UNIQUE USING '
+                    'INDEX %s' % (INDEX_NAME, INDEX_NAME),
+                    'ALTER TABLE core_tag DROP CONSTRAINT %s' % INDEX_NAME,
+                ),
+                migrations.RunPython(add_unique_together,
+                                     remove_unique_together),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='tag',
+                    unique_together={('user', 'name')},
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The index is built without locking the table
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_userdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', 'updated_at'],
+                               name='core_tag_user_updated_idx'),
+        ),
+    ]
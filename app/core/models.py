@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser,\
                                         BaseUserManager, \
                                         PermissionsMixin
@@ -45,6 +46,93 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class TagQuerySet(models.QuerySet):
+
+    def alive(self):
+        """Tags that were not deleted, tombstones are only kept for sync"""
+        return self.filter(deleted_at__isnull=True)
+
+    def soft_delete(self):
+        """Turn the live tags into tombstones, return their count"""
+        now = timezone.now()
+        return self.alive().update(deleted_at=now, updated_at=now)
+
+
+class TagManager(models.Manager.from_queryset(TagQuerySet)):
+
+    def upsert(self, user, name):
+        """
+        Return the tag of user called name, creating it when missing (or
+        reviving it when deleted). On PostgreSQL this is a single
+        INSERT ... ON CONFLICT round trip.
+        :param user: (User) owner of the tag
+        :param name: (str)
+        :return: (Tag, bool) the tag and whether it was created
+        """
+        (pk, created), = self.bulk_upsert(user, [name])
+        return self.model(id=pk, user=user, name=name), created
+
+    def bulk_upsert(self, user, names, batch_size=500):
+        """
+        Upsert several tags of user, names must not repeat. Deleted tags
+        are revived and reported as created.
+        :return: [(id, created)] in the order of names
+        """
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        now = timezone.now()
+        if connection.vendor != 'postgresql':
+            with transaction.atomic(using=db):
+                results = []
+                for name in names:
+                    tag, created = self.using(db).get_or_create(user=user,
+                                                                name=name)
+                    if tag.deleted_at is not None:
+                        self.using(db).filter(pk=tag.pk).update(
+                            deleted_at=None, created_at=now, updated_at=now
+                        )
+                        created = True
+                    results.append((tag.pk, created))
+                return results
+
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        results = {}
+        with connection.cursor() as cursor:
+            for start in range(0, len(names), batch_size):
+                batch = names[start:start + batch_size]
+                # DO UPDATE (unlike DO NOTHING) returns the existing rows,
+                # xmax is 0 only for rows this statement inserted. Revived
+                # tombstones restart from now, live tags are left untouched
+                cursor.execute(
+                    'INSERT INTO {table} ({user}, {name}, {created}, '
+                    '{updated}) VALUES {values} '
+                    'ON CONFLICT ({user}, {name}) DO UPDATE SET '
+                    '{name} = EXCLUDED.{name}, '
+                    '{created} = CASE WHEN {table}.{deleted} IS NULL '
+                    'THEN {table}.{created} ELSE EXCLUDED.{created} END, '
+                    '{updated} = CASE WHEN {table}.{deleted} IS NULL '
+                    'THEN {table}.{updated} ELSE EXCLUDED.{updated} END, '
+                    '{deleted} = NULL '
+                    'RETURNING {name}, {id}, '
+                    '(xmax = 0 OR {created} = %s)'.format(
+                        table=qn(opts.db_table),
+                        user=qn(opts.get_field('user').column),
+                        name=qn(opts.get_field('name').column),
+                        created=qn(opts.get_field('created_at').column),
+                        updated=qn(opts.get_field('updated_at').column),
+                        deleted=qn(opts.get_field('deleted_at').column),
+                        id=qn(opts.pk.column),
+                        values=', '.join(['(%s, %s, %s, %s)'] * len(batch)),
+                    ),
+                    [value for name in batch
+                     for value in (user.pk, name, now, now)] + [now],
+                )
+                results.update((name, (pk, created))
+                               for name, pk, created in cursor.fetchall())
+        return [results[name] for name in names]
+
+
 class Tag(models.Model):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=255)
@@ -52,6 +140,39 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Null for the tags created before change tracking
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    # Deleted tags stay as tombstones so syncing clients learn about them
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TagManager()
+
+    class Meta:
+        unique_together = (('user', 'name'),)
+        indexes = [
+            # Serves the per-user keyset pagination ordered by (name, id)
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_tag_user_name_id_idx'),
+            # Serves the ?since= sync of the changes of a user
+            models.Index(fields=['user', 'updated_at'],
+                         name='core_tag_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class UserDeletion(models.Model):
+    """Progress of a user deleted in the background by core.deletion"""
+    # Not a foreign key, the record outlives the user
+    user_id = models.IntegerField(unique=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    tokens_deleted = models.IntegerField(default=0)
+    tags_deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return 'Deletion of user %d' % self.user_id
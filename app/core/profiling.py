@@ -0,0 +1,147 @@
+"""
+Sampling request profiler.
+
+SamplingProfilerMiddleware runs cProfile over a random
+settings.PROFILER['SAMPLE_RATE'] share of the requests, and over every
+request carrying a header signed by `profile_report --sign`. Each profile
+is dumped in DIR/<route>/ next to a JSON file listing the SQL it executed;
+`profile_report` aggregates them. Past MAX_PROFILES dumps, all routes
+together, the oldest ones are deleted. Without DIR the middleware removes
+itself from the stack, costing nothing.
+"""
+import cProfile
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import connections
+
+SIGNER_SALT = 'core.profiling'
+
+
+def sign_profile_header():
+    """Return a value for the profiling header"""
+    return TimestampSigner(salt=SIGNER_SALT).sign('profile')
+
+
+def route_directory(route):
+    """Directory name of a view name such as 'recipe:tag-list'"""
+    return re.sub(r'[^\w.-]', '_', route)
+
+
+class QueryRecorder:
+    """execute_wrapper keeping the SQL of a request and its time"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'duration': time.perf_counter() - start,
+            })
+
+
+class SamplingProfilerMiddleware:
+    """Profile a sample of the requests, see the module documentation"""
+
+    def __init__(self, get_response):
+        config = settings.PROFILER
+        if not config.get('DIR'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = config['DIR']
+        self.sample_rate = config.get('SAMPLE_RATE', 0)
+        self.header = 'HTTP_' + config.get('HEADER', 'X-Profile') \
+            .upper().replace('-', '_')
+        self.max_age = config.get('HEADER_MAX_AGE', 3600)
+        self.max_profiles = config.get('MAX_PROFILES', 1000)
+        self.counter = itertools.count()
+
+    def should_profile(self, request):
+        signed = request.META.get(self.header)
+        if signed:
+            try:
+                TimestampSigner(salt=SIGNER_SALT).unsign(
+                    signed, max_age=self.max_age
+                )
+            except BadSignature:
+                pass
+            else:
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        recorders = [QueryRecorder(alias) for alias in connections]
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(
+                    connections[recorder.alias].execute_wrapper(recorder)
+                )
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unresolved'
+        self.dump(profile, route, {
+            'route': route,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration': duration,
+            'queries': [query for recorder in recorders
+                        for query in recorder.queries],
+        })
+        return response
+
+    def dump(self, profile, route, info):
+        """Write <stamp>.prof and <stamp>.sql.json in the route directory"""
+        directory = os.path.join(self.directory, route_directory(route))
+        os.makedirs(directory, exist_ok=True)
+        stamp = '%d-%d-%d' % (time.time() * 1000, os.getpid(),
+                              next(self.counter))
+        profile.dump_stats(os.path.join(directory, stamp + '.prof'))
+        with open(os.path.join(directory, stamp + '.sql.json'), 'w') as fp:
+            json.dump(info, fp)
+        if self.max_profiles:
+            self.prune()
+
+    def prune(self):
+        """Delete the oldest dumps beyond max_profiles"""
+        profiles = glob.glob(os.path.join(self.directory, '*', '*.prof'))
+        if len(profiles) <= self.max_profiles:
+            return
+        # Stamps are <milliseconds>-<pid>-<counter>
+        profiles.sort(key=lambda path: [
+            int(part) for part in os.path.basename(path)[:-5].split('-')
+        ])
+        for path in profiles[:len(profiles) - self.max_profiles]:
+            for name in (path, path[:-5] + '.sql.json'):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    # Pruned by another worker
+                    pass
@@ -0,0 +1,31 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding through orjson when it is installed, producing
+    the same bytes as the stock renderer for str/int/list/dict payloads.
+    Anything else (indentation, ASCII output, other types) falls back to
+    the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or \
+                not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default)
+        except TypeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # Same escaping of the JavaScript line terminators as JSONRenderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028') \
+                  .replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_tokens
+from core.conditional import bump_user_version
+from core.last_login import record_last_login
+from core.models import Tag
+from user.cache import invalidate_me
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Drop the cached user of a deleted token"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Cached users must not outlive an update or a deactivation"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        # Logins do not change anything the API returns
+        return
+    if created:
+        # Ids may be reused after a delete (or a rolled back test)
+        invalidate_me([instance.pk])
+    else:
+        invalidate_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
+        bump_user_version(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, **kwargs):
+    """Cached tag lists of the owner are stale"""
+    bump_user_version(instance.user_id)
+
+
+# The setting is read at every login, not once here
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+user_logged_in.connect(record_last_login, dispatch_uid='record_last_login')
@@ -0,0 +1,61 @@
+import zlib
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+
+
+def iter_json_array(items, renderer, chunk_size=1000):
+    """
+    Encode an iterable as a JSON array, chunk_size items at a time.
+    The output joined together is the same as renderer.render(list(items))
+    for a compact renderer, while only one chunk is held in memory.
+    """
+    items = iter(items)
+    separator = b'['
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            break
+        yield separator + renderer.render(chunk)[1:-1]
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a byte stream, flushing after every chunk to keep it flowing"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + \
+            compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_json_response(request, items, renderer, chunk_size=1000,
+                            gzip=True):
+    """
+    Return a StreamingHttpResponse of the JSON array of items, gzipped
+    when allowed and the client accepts it
+    :param request: (HttpRequest) the request being answered
+    :param items: (iterable) JSON serializable items, ideally a DB iterator
+    :param renderer: (JSONRenderer) compact renderer encoding the chunks
+    """
+    chunks = iter_json_array(items, renderer, chunk_size)
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = '%s; charset=%s' % (content_type, renderer.charset)
+
+    accepts_gzip = re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    if gzip and accepts_gzip:
+        response = StreamingHttpResponse(gzip_chunks(chunks),
+                                         content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
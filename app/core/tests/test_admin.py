@@ -2,6 +2,10 @@ from django.test import TestCase, Client
 from django.contrib.auth import  get_user_model
 
 from django.urls import reverse
+
+from user.cache import cache_me, get_cached_me
+
+
 class AdminSiteTests(TestCase):
 
     def setUp(self):
@@ -50,4 +54,18 @@ class AdminSiteTests(TestCase):
 
         url = reverse('admin:core_user_add')
         rest = self.client.get(url)
-        self.assertEqual(rest.status_code, 200)
\ No newline at end of file
+        self.assertEqual(rest.status_code, 200)
+
+    def test_change_user_invalidates_profile_cache(self):
+        """
+        Test that editing a user in the admin drops its cached /me
+        :return:
+        """
+        cache_me(self.user.pk, {'email': self.user.email, 'name': 'Old'})
+        url = reverse('admin:core_user_change', args=[self.user.id])
+
+        self.client.post(url, {
+            'email': self.user.email, 'name': 'New', 'is_active': 'on',
+        })
+
+        self.assertIsNone(get_cached_me(self.user.pk))
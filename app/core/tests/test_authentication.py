@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, get_token_store
+from core.cache import LocalLRUCache, build_store
+
+ME_URL = reverse('user:me')
+
+
+class LocalLRUCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest entry is dropped once the cache is full"""
+        cache = LocalLRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Test that entries are not returned after their timeout"""
+        cache = LocalLRUCache(timeout=10)
+        with patch('core.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with patch('core.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_local_timeout_caps_local_stores(self):
+        """Test that per-process stores keep entries for LOCAL_TIMEOUT"""
+        config = {'TIMEOUT': 300, 'LOCAL_TIMEOUT': 5}
+
+        self.assertEqual(build_store(dict(config, BACKEND='local')).timeout,
+                         5)
+        self.assertEqual(build_store(dict(config, BACKEND='django')).timeout,
+                         300)
+
+
+@override_settings(TOKEN_AUTH_CACHE={'BACKEND': 'local', 'MAX_SIZE': 100,
+                                     'TIMEOUT': 300})
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@londonappdev.com',
+            password='testpass',
+            name='name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_second_call_is_served_from_cache(self):
+        """Test that a known token is resolved without queries"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_cached_user_is_not_shared(self):
+        """Test that changes to the returned user don't leak to the cache"""
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        user.name = 'changed'
+
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user.name, 'name')
+
+    def test_deleted_token_is_invalidated(self):
+        """Test that a deleted token stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        self.assertIsNone(get_token_store().get(self.token.key))
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_is_invalidated(self):
+        """Test that deactivating the user rejects its cached token"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_profile_update_is_visible(self):
+        """Test that updating /me refreshes the cached user"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        client.get(ME_URL)
+
+        res = client.patch(ME_URL, {'name': 'newName'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'newName')
@@ -0,0 +1,127 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.metrics import REGISTRY
+from core.models import Tag
+
+BATCH_URL = reverse('batch:batch')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class BatchApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com', 'testpass', name='Test'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def batch(self, requests, **extra):
+        return self.client.post(BATCH_URL, dict(extra, requests=requests),
+                                format='json')
+
+    def test_login_required(self):
+        """Test that the batch endpoint requires a token"""
+        res = APIClient().post(BATCH_URL, {'requests': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_runs_requests_in_order(self):
+        """Test that every sub-request answers as if called directly"""
+        res = self.batch([
+            {'method': 'GET', 'path': ME_URL},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'method': 'GET', 'path': TAGS_URL + '?prefix=veg'},
+        ])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        me, created, listed = res.data['responses']
+        self.assertEqual(me['body'], {'email': 'test@gmail.com',
+                                      'name': 'Test'})
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(listed['body'], [created['body']])
+        self.assertIn('ETag', listed['headers'])
+
+    def test_authenticates_once(self):
+        """Test that the token is resolved for the batch only"""
+        requests = [{'method': 'GET', 'path': ME_URL}] * 3
+        self.batch(requests)
+
+        # Token cached, ETag versions and /me cached: nothing left to query
+        with self.assertNumQueries(0):
+            res = self.batch(requests)
+        self.assertEqual([item['status'] for item in res.data['responses']],
+                         [200, 200, 200])
+
+    def test_other_urls_not_reachable(self):
+        """Test that only the user and recipe APIs can be called"""
+        res = self.batch([{'method': 'GET', 'path': '/admin/'},
+                          {'method': 'GET', 'path': '/nowhere/'}])
+
+        self.assertEqual([item['status'] for item in res.data['responses']],
+                         [404, 404])
+
+    def test_atomic_rolls_back(self):
+        """Test that an atomic batch is undone by a failed request"""
+        res = self.batch([
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': ''}},
+            {'method': 'GET', 'path': ME_URL},
+        ], atomic=True)
+
+        self.assertFalse(res.data['committed'])
+        self.assertEqual([item['status'] for item in res.data['responses']],
+                         [201, 400, 424])
+        self.assertFalse(Tag.objects.exists())
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_batch_size_limited(self):
+        """Test that oversized batches are rejected"""
+        res = self.batch([{'path': ME_URL}] * 3)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(REQUEST_DEADLINE=dict(
+    settings.REQUEST_DEADLINE, MAX_QUEUE_TIME=1
+))
+class BatchMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com', 'testpass', name='Test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        REGISTRY.reset()
+
+    def test_batch_is_shed(self):
+        """Test that a batch cannot get around the load shedding"""
+        res = self.client.post(BATCH_URL, {'requests': [{'path': ME_URL}]},
+                               format='json',
+                               HTTP_X_REQUEST_START='t=%d' % (
+                                   time.time() - 5))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_calls_measured_by_route(self):
+        """Test that each call is counted under its own route"""
+        self.client.post(BATCH_URL, {'requests': [{'path': ME_URL}] * 2},
+                         format='json')
+
+        totals = REGISTRY.snapshot()
+        self.assertEqual(totals[('http_requests_total',
+                                 ('user:me', 'GET', '200'))], 2)
+        self.assertEqual(totals[('http_requests_total',
+                                 ('batch:batch', 'POST', '200'))], 1)
@@ -0,0 +1,49 @@
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_shared_caches
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+SHARED = {'default': {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'cache',
+}}
+ME_CACHE = {'BACKEND': 'django', 'ALIAS': 'default'}
+
+
+@override_settings(DEBUG=False, USER_VERSION_CACHE='default',
+                   USER_ME_CACHE=ME_CACHE)
+class SharedCachesCheckTests(SimpleTestCase):
+
+    def ids(self):
+        return [error.id for error in check_shared_caches(None)]
+
+    @override_settings(CACHES=LOCMEM)
+    def test_per_process_caches(self):
+        """Test that LocMemCache is refused for the shared data"""
+        self.assertEqual(self.ids(), ['core.E001', 'core.E002'])
+
+    @override_settings(CACHES=SHARED,
+                       USER_ME_CACHE=dict(ME_CACHE, BACKEND='local'))
+    def test_local_me_cache(self):
+        """Test that a per-process /me store is refused"""
+        self.assertEqual(self.ids(), ['core.E002'])
+
+    @override_settings(CACHES=SHARED)
+    def test_shared_caches(self):
+        self.assertEqual(self.ids(), [])
+
+    @override_settings(CACHES=LOCMEM, DEBUG=True)
+    def test_debug(self):
+        """Test that a development server may keep LocMemCache"""
+        self.assertEqual(self.ids(), [])
+
+    @override_settings(CACHES=LOCMEM)
+    def test_deploy_only(self):
+        """Test that the check runs with `check --deploy` only"""
+        deploy = run_checks(include_deployment_checks=True)
+
+        self.assertIn('core.E001', [error.id for error in deploy])
+        self.assertNotIn('core.E001', [error.id for error in run_checks()])
@@ -1,7 +1,22 @@
-from unittest.mock import patch
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import MagicMock, patch
 from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import migrations, models
 from django.db.utils import OperationalError
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from core.db.operations import AddIndexConcurrently
+from core.management.commands.benchmark_api import find_regressions
+from core.management.commands.check_migrations import check_migration
+from core.models import Tag
 
 class CommandTests(TestCase):
 
@@ -12,9 +27,10 @@ class CommandTests(TestCase):
         """
 
         with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+            call_command('wait_for_db', stdout=StringIO())
+            cursor = gi.return_value.cursor.return_value.__enter__()
+            cursor.execute.assert_called_once_with('SELECT 1')
+            self.assertEqual(gi.return_value.cursor.call_count, 1)
 
 
     @patch("time.sleep", return_value=True)
@@ -24,8 +40,347 @@ class CommandTests(TestCase):
         :return:
         """
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            gi.return_value.cursor.side_effect = \
+                [OperationalError] * 5 + [MagicMock()]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(gi.return_value.cursor.call_count, 6)
+            self.assertEqual(gi.return_value.close.call_count, 5)
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_backoff(self, ts):
+        """
+        Test that the delay doubles up to the maximum
+        :return:
+        """
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = \
+                [OperationalError] * 5 + [MagicMock()]
+            call_command('wait_for_db', initial_delay=1, max_delay=4,
+                         stdout=StringIO())
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 4, 4])
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """
+        Test that the command fails once the timeout is spent
+        :return:
+        """
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = OperationalError
+            with patch('time.monotonic', side_effect=[0, 1, 2, 11]):
+                with self.assertRaises(CommandError):
+                    call_command('wait_for_db', timeout=10,
+                                 stdout=StringIO())
+        self.assertEqual(ts.call_count, 2)
+
+    def test_wait_for_several_databases(self):
+        """
+        Test that every alias given is checked
+        :return:
+        """
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            call_command('wait_for_db', databases=['default', 'replica'],
+                         stdout=StringIO())
+        aliases = [call[0][0] for call in gi.call_args_list]
+        self.assertEqual(aliases, ['default', 'replica'])
+
+    def test_wait_for_db_warmup(self):
+        """
+        Test that warm up opens and closes N connections
+        :return:
+        """
+        out = StringIO()
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            call_command('wait_for_db', warmup=3, stdout=out)
+            copy = gi.return_value.copy
+            self.assertEqual(copy.call_count, 3)
+            self.assertEqual(copy.return_value.ensure_connection.call_count,
+                             3)
+            self.assertEqual(copy.return_value.close.call_count, 3)
+        self.assertIn('Warmed up 3 connections to default', out.getvalue())
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_benchmark_api(self):
+        """
+        Test that every scenario runs and results are written as JSON
+        :return:
+        """
+        fd, output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, output)
+
+        call_command('benchmark_api', users=2, tags=3, requests=4, warmup=1,
+                     concurrency=1, isolate=False, output=output,
+                     stdout=StringIO())
+
+        with open(output) as fp:
+            results = json.load(fp)['results']
+        self.assertEqual(set(results),
+                         {'create', 'token', 'me', 'tags-list',
+                          'tags-create'})
+        for result in results.values():
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0)
+        self.assertEqual(results['tags-list']['queries_per_request'], 1)
+        # Run against the current database, the seeded data is gone
+        self.assertFalse(get_user_model().objects.filter(
+            email__startswith='bench-').exists())
+        self.assertFalse(Token.objects.exists())
+
+    def test_find_regressions(self):
+        """
+        Test that slower, lower throughput or chattier results are flagged
+        :return:
+        """
+        baseline = {'me': {'p95_ms': 10, 'rps': 100,
+                           'queries_per_request': 1}}
+        same = {'me': {'p95_ms': 11, 'rps': 90, 'queries_per_request': 1}}
+        worse = {'me': {'p95_ms': 20, 'rps': 50, 'queries_per_request': 2}}
+
+        self.assertEqual(find_regressions(same, baseline, 0.2), [])
+        self.assertEqual(len(find_regressions(worse, baseline, 0.2)), 3)
+
+
+class ImportUsersCommandTests(TestCase):
+
+    def write_input(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv(self):
+        """
+        Test that users are created with normalized emails and passwords
+        :return:
+        """
+        path = self.write_input(
+            'email,password,name\n'
+            'first@GMAIL.com,firstpass,First\n'
+            'second@gmail.com,secondpass,Second\n', '.csv'
+        )
+
+        call_command('import_users', path, workers=0, stdout=StringIO())
+
+        user = get_user_model().objects.get(email='first@gmail.com')
+        self.assertEqual(user.name, 'First')
+        self.assertTrue(user.check_password('firstpass'))
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+    def test_import_jsonl_with_process_pool(self):
+        """
+        Test JSON lines input hashed by worker processes
+        :return:
+        """
+        path = self.write_input(
+            '{"email": "first@gmail.com", "password": "firstpass"}\n'
+            '{"email": "second@gmail.com", "password": "secondpass"}\n',
+            '.jsonl'
+        )
+
+        call_command('import_users', path, workers=2, stdout=StringIO())
+
+        user = get_user_model().objects.get(email='second@gmail.com')
+        self.assertTrue(user.check_password('secondpass'))
+
+    def test_import_skips_duplicates(self):
+        """
+        Test that existing, repeated and missing emails are skipped
+        :return:
+        """
+        get_user_model().objects.create_user('taken@gmail.com', 'pass')
+        path = self.write_input(
+            'email,password\n'
+            'taken@GMAIL.COM,pass\n'
+            'new@gmail.com,pass\n'
+            'new@gmail.com,pass\n'
+            ',pass\n', '.csv'
+        )
+        out, err = StringIO(), StringIO()
+
+        call_command('import_users', path, workers=0, batch_size=2,
+                     report_duplicates=True, stdout=out, stderr=err)
 
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertIn('Imported 1 users, skipped 3', out.getvalue())
+        self.assertIn('Row 1: skipped taken@gmail.com', err.getvalue())
+        self.assertIn('Row 3: skipped new@gmail.com', err.getvalue())
+
+    def test_import_resumes_from_offset(self):
+        """
+        Test that --offset skips rows already imported
+        :return:
+        """
+        path = self.write_input(
+            'email,password\n'
+            'first@gmail.com,pass\n'
+            'second@gmail.com,pass\n', '.csv'
+        )
+        out = StringIO()
+
+        call_command('import_users', path, workers=0, offset=1, stdout=out)
+
+        emails = list(get_user_model().objects.values_list('email',
+                                                           flat=True))
+        self.assertEqual(emails, ['second@gmail.com'])
+        self.assertIn('resume with --offset 2', out.getvalue())
+
+
+class ExportDataCommandTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.first = User.objects.create_user('first@gmail.com', 'pass',
+                                              name='First')
+        self.second = User.objects.create_user('second@gmail.com', 'pass')
+        Tag.objects.create(user=self.first, name='Vegan')
+        Tag.objects.create(user=self.second, name='Dessert')
+
+    def export(self, *args, **options):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('export_data', *args, output=path, stderr=StringIO(),
+                     **options)
+        return path
+
+    def test_export_users_jsonl(self):
+        """
+        Test that users are exported one JSON object per line
+        :return:
+        """
+        path = self.export('users', chunk_size=1)
+
+        with open(path) as fp:
+            rows = [json.loads(line) for line in fp]
+        self.assertEqual([row['email'] for row in rows],
+                         ['first@gmail.com', 'second@gmail.com'])
+        self.assertEqual(rows[0]['name'], 'First')
+        self.assertNotIn('password', rows[0])
+
+    def test_export_tags_csv_gzip_by_user_range(self):
+        """
+        Test a compressed CSV export restricted to a user id range
+        :return:
+        """
+        path = self.export('tags', format='csv', gzip=True,
+                           min_user_id=self.second.id,
+                           max_user_id=self.second.id)
+
+        with gzip.open(path, 'rt', newline='') as fp:
+            rows = list(csv.reader(fp))
+        self.assertEqual(rows, [['id', 'user_id', 'name'],
+                                [rows[1][0], str(self.second.id), 'Dessert']])
+
+    def test_export_skips_deleted_tags(self):
+        """
+        Test that the tombstones of deleted tags are not exported
+        :return:
+        """
+        Tag.objects.filter(user=self.first).soft_delete()
+        path = self.export('tags')
+
+        with open(path) as fp:
+            rows = [json.loads(line) for line in fp]
+        self.assertEqual([row['name'] for row in rows], ['Dessert'])
+
+
+class CheckMigrationsCommandTests(TestCase):
+
+    def make_migration(self, operations, atomic=True):
+        migration = migrations.Migration('0100_test', 'core')
+        migration.operations = operations
+        migration.atomic = atomic
+        return migration
+
+    def levels(self, migration):
+        return [level for _, level, _ in check_migration(migration)]
+
+    def test_blocking_index_flagged(self):
+        """
+        Test that AddIndex on an existing table is an error
+        :return:
+        """
+        index = models.Index(fields=['name'], name='core_tag_name_idx')
+
+        self.assertEqual(self.levels(self.make_migration([
+            migrations.AddIndex(model_name='tag', index=index),
+        ])), ['error'])
+
+    def test_concurrent_index_needs_non_atomic_migration(self):
+        """
+        Test that concurrent operations are only accepted outside a
+        transaction
+        :return:
+        """
+        index = models.Index(fields=['name'], name='core_tag_name_idx')
+        operations = [AddIndexConcurrently(model_name='tag', index=index)]
+
+        self.assertEqual(self.levels(self.make_migration(operations)),
+                         ['error'])
+        self.assertEqual(self.levels(self.make_migration(operations,
+                                                         atomic=False)), [])
+
+    def test_new_models_and_concurrent_sql_allowed(self):
+        """
+        Test that indexes of a new table and CONCURRENTLY SQL pass
+        :return:
+        """
+        self.assertEqual(self.levels(self.make_migration([
+            migrations.CreateModel('Note', [
+                ('id', models.AutoField(primary_key=True)),
+                ('text', models.TextField()),
+            ]),
+            migrations.AddIndex(model_name='note', index=models.Index(
+                fields=['text'], name='core_note_text_idx')),
+        ])), [])
+        concurrent = migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY a ON core_tag (name)'
+        )
+        self.assertEqual(self.levels(self.make_migration([concurrent],
+                                                         atomic=False)), [])
+        self.assertEqual(self.levels(self.make_migration([concurrent])),
+                         ['error'])
+        self.assertEqual(self.levels(self.make_migration([
+            migrations.RunSQL('create unique index a on core_tag (name)'),
+        ])), ['error'])
+
+    def test_separate_database_and_state(self):
+        """
+        Test that the database side of SeparateDatabaseAndState is checked
+        :return:
+        """
+        self.assertEqual(self.levels(self.make_migration([
+            migrations.SeparateDatabaseAndState(
+                database_operations=[migrations.RunSQL(
+                    'CREATE INDEX a ON core_tag (name)'
+                )],
+                state_operations=[migrations.AlterUniqueTogether(
+                    name='tag', unique_together={('user', 'name')}
+                )],
+            ),
+        ])), ['error'])
+
+    def test_applied_migrations_skipped(self):
+        """
+        Test that only pending migrations are checked by default
+        :return:
+        """
+        out = StringIO()
+        call_command('check_migrations', stdout=out)
+
+        self.assertIn('0 migrations checked', out.getvalue())
+
+    def test_repo_migrations_do_not_block(self):
+        """
+        Test that every migration of the repo passes the checker
+        :return:
+        """
+        out = StringIO()
+        call_command('check_migrations', all=True, stdout=out)
 
+        self.assertNotIn(': error', out.getvalue())
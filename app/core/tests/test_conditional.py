@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.conditional import bump_user_version, get_user_version
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+BULK_TAGS_URL = reverse('recipe:tag-bulk')
+ME_URL = reverse('user:me')
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag / Last-Modified handling of the tag list and /me"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@londonappdev.com',
+            password='testpass',
+            name='name'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_tags_not_modified(self):
+        """Test that a matching If-None-Match is answered without queries"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(TAGS_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_created_tag_changes_etag(self):
+        """Test that creating a tag invalidates the previous ETag"""
+        etag = self.client.get(TAGS_URL)['ETag']
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data), 1)
+
+    def test_bulk_created_tags_change_etag(self):
+        """Test that bulk creation invalidates the previous ETag"""
+        etag = self.client.get(TAGS_URL)['ETag']
+        self.client.post(BULK_TAGS_URL, [{'name': 'Vegan'}], format='json')
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_query(self):
+        """Test that different pages don't share an ETag"""
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, {'page_size': 10},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_updated_profile_changes_etag(self):
+        """Test that updating /me invalidates the previous ETag"""
+        etag = self.client.get(ME_URL)['ETag']
+        self.client.patch(ME_URL, {'name': 'newName'})
+
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'newName')
+
+    def test_if_modified_since(self):
+        """Test that Last-Modified is honoured when there is no ETag"""
+        last_modified = self.client.get(ME_URL)['Last-Modified']
+
+        res = self.client.get(ME_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(ME_URL, {'name': 'newName'})
+        res = self.client.get(ME_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_versions_are_per_user(self):
+        """Test that another user's changes don't touch this user's ETag"""
+        etag = self.client.get(TAGS_URL)['ETag']
+        other = get_user_model().objects.create_user('other@gmail.com',
+                                                     'other')
+        Tag.objects.create(user=other, name='Fruity')
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class VersionBumpCommitTests(TransactionTestCase):
+    """Test the versions bumped inside a transaction"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bumped_again_on_commit(self):
+        """Test that ETags computed before the commit do not stay valid"""
+        with transaction.atomic():
+            bump_user_version(1)
+            before_commit = get_user_version(1)
+
+        self.assertGreater(get_user_version(1)[0], before_commit[0])
+
+    def test_bumped_once_outside_transactions(self):
+        """Test that autocommit writes bump the version once"""
+        version = get_user_version(1)[0]
+
+        bump_user_version(1)
+
+        self.assertEqual(get_user_version(1)[0], version + 1)
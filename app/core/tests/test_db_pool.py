@@ -0,0 +1,242 @@
+import threading
+from unittest.mock import patch
+
+from django.db import connections
+from django.test import SimpleTestCase
+from psycopg2 import ProgrammingError, extensions
+
+from core.db.backends.postgresql_pool import base
+from core.db.pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+        return ConnectionPool(connect, **kwargs)
+
+    def test_connections_are_reused(self):
+        """Test that a returned connection is handed out again"""
+        pool = self.make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_min_size_is_opened_up_front(self):
+        """Test that min_size connections are opened on first use"""
+        pool = self.make_pool(min_size=3)
+        pool.getconn()
+
+        stats = pool.stats()
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_max_size_times_out(self):
+        """Test that checkout fails once max_size connections are in use"""
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.getconn()
+
+        with self.assertRaises(PoolExhausted):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_returned_connection(self):
+        """Test that a blocked checkout is served by a return"""
+        pool = self.make_pool(max_size=1, timeout=5)
+        conn = pool.getconn()
+        got = []
+        thread = threading.Thread(target=lambda: got.append(pool.getconn()))
+        thread.start()
+        pool.putconn(conn)
+        thread.join()
+
+        self.assertEqual(got, [conn])
+
+    def test_expired_connections_are_replaced(self):
+        """Test that connections older than max_lifetime are closed"""
+        pool = self.make_pool(max_lifetime=60)
+        with patch('core.db.pool.time.monotonic', return_value=0):
+            conn = pool.getconn()
+            pool.putconn(conn)
+        with patch('core.db.pool.time.monotonic', return_value=61):
+            new = pool.getconn()
+
+        self.assertIsNot(new, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['expired'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_failed_health_check(self):
+        """Test that connections failing the check are not handed out"""
+        pool = self.make_pool(check=lambda conn: False, check_interval=10)
+        with patch('core.db.pool.time.monotonic', return_value=0):
+            conn = pool.getconn()
+            pool.putconn(conn)
+        with patch('core.db.pool.time.monotonic', return_value=5):
+            self.assertIs(pool.getconn(), conn)
+            pool.putconn(conn)
+        with patch('core.db.pool.time.monotonic', return_value=20):
+            new = pool.getconn()
+
+        self.assertIsNot(new, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['check_failures'], 1)
+
+    def test_failed_reset_discards(self):
+        """Test that a connection that cannot be reset is closed"""
+        def reset(conn):
+            raise RuntimeError('broken')
+        pool = self.make_pool(reset=reset)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_close(self):
+        """Test that closing the pool closes idle and returned connections"""
+        pool = self.make_pool()
+        idle, busy = pool.getconn(), pool.getconn()
+        pool.putconn(idle)
+        pool.close()
+        pool.putconn(busy)
+
+        self.assertTrue(idle.closed)
+        self.assertTrue(busy.closed)
+
+
+class FakePgConnection:
+    """The transaction handling of a psycopg2 connection"""
+    isolation_level = extensions.ISOLATION_LEVEL_READ_COMMITTED
+
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.in_transaction = False
+        self.status = None
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                pass
+
+            def execute(self, sql, params=None):
+                if not conn.autocommit:
+                    conn.in_transaction = True
+        return Cursor()
+
+    def get_transaction_status(self):
+        if self.status is not None:
+            return self.status
+        if self.in_transaction:
+            return extensions.TRANSACTION_STATUS_INTRANS
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def reset(self):
+        # Like psycopg2, back to the default session out of autocommit
+        self.in_transaction = False
+        self.autocommit = False
+        self.isolation_level = FakePgConnection.isolation_level
+
+    def set_session(self, isolation_level=None):
+        if self.in_transaction:
+            raise ProgrammingError(
+                'set_session cannot be used inside a transaction'
+            )
+        self.isolation_level = isolation_level
+
+    def close(self):
+        self.closed = 1
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    params = {'database': 'pool_tests'}
+
+    def setUp(self):
+        patcher = patch.object(base.Database, 'connect',
+                               side_effect=lambda **params: FakePgConnection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(base.close_pools, database='pool_tests')
+
+    def make_wrapper(self, **settings):
+        settings_dict = dict(connections['default'].settings_dict,
+                             ENGINE='core.db.backends.postgresql_pool',
+                             OPTIONS={}, POOL={})
+        settings_dict.update(settings)
+        return base.DatabaseWrapper(settings_dict, alias='pool_tests')
+
+    def checkout(self, wrapper):
+        wrapper.connection = wrapper.get_new_connection(self.params)
+        return wrapper.connection
+
+    def test_connection_returned_on_close(self):
+        """Test that closing the wrapper gives the connection back"""
+        wrapper = self.make_wrapper()
+        conn = self.checkout(wrapper)
+        wrapper._close()
+
+        self.assertIs(self.checkout(wrapper), conn)
+        self.assertEqual(wrapper.get_pool(self.params).stats()['reused'], 1)
+
+    def test_checkout_after_health_check(self):
+        """Test that a checked idle connection can still be configured"""
+        serializable = extensions.ISOLATION_LEVEL_SERIALIZABLE
+        wrapper = self.make_wrapper(
+            OPTIONS={'isolation_level': serializable},
+            POOL={'HEALTH_CHECK_INTERVAL': 10},
+        )
+        with patch('core.db.pool.time.monotonic', return_value=0):
+            conn = self.checkout(wrapper)
+            wrapper._close()
+        with patch('core.db.pool.time.monotonic', return_value=20):
+            self.assertIs(self.checkout(wrapper), conn)
+
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(conn.isolation_level, serializable)
+        wrapper.set_autocommit(True)
+        self.assertTrue(conn.autocommit)
+
+    def test_busy_connections_are_discarded(self):
+        """Test that connections running a query are not pooled again"""
+        wrapper = self.make_wrapper()
+        conn = self.checkout(wrapper)
+        conn.status = extensions.TRANSACTION_STATUS_ACTIVE
+        wrapper._close()
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(self.checkout(wrapper), conn)
+
+    def test_exhausted_pool(self):
+        """Test that a full pool raises the driver's OperationalError"""
+        wrapper = self.make_wrapper(POOL={'MAX_SIZE': 1, 'TIMEOUT': 0.01})
+        self.checkout(wrapper)
+
+        with self.assertRaises(base.Database.OperationalError):
+            wrapper.get_new_connection(self.params)
@@ -0,0 +1,227 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from rest_framework.test import APIClient
+
+from core import deadline
+from core.metrics import REGISTRY
+
+TAGS_URL = reverse('recipe:tag-list')
+METRICS_URL = reverse('metrics')
+
+DEADLINE = {
+    'DEFAULT': 5,
+    'ROUTES': {'recipe:tag-bulk': 30},
+    'MAX_QUEUE_TIME': 2,
+    'MAX_IN_FLIGHT': 2,
+    'RETRY_AFTER': 3,
+    'NAMESPACES': ('recipe',),
+}
+
+
+def query_canceled():
+    """The error Django raises for a query cancelled by PostgreSQL"""
+    cause = Exception('canceling statement due to statement timeout')
+    cause.pgcode = deadline.QUERY_CANCELED
+    error = OperationalError(*cause.args)
+    error.__cause__ = cause
+    return error
+
+
+def request_start(seconds_ago, scale=1):
+    return 't=%d' % ((time.time() - seconds_ago) * scale)
+
+
+class ParseRequestStartTests(TestCase):
+
+    def test_units(self):
+        """Test that seconds, milliseconds and microseconds are read"""
+        now = time.time()
+        for scale in (1, 1000, 1000000):
+            self.assertAlmostEqual(
+                deadline.parse_request_start('t=%d' % (now * scale)), now,
+                delta=1
+            )
+
+    def test_malformed(self):
+        self.assertIsNone(deadline.parse_request_start('t=soon'))
+        self.assertIsNone(deadline.parse_request_start(None))
+
+
+@override_settings(REQUEST_DEADLINE=DEADLINE)
+class DeadlineMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@gmail.com',
+                                                         'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        REGISTRY.reset()
+
+    def shed_count(self, reason):
+        return REGISTRY.snapshot().get(
+            ('http_requests_shed_total', ('recipe:tag-list', reason)), 0
+        )
+
+    def test_serves_fresh_requests(self):
+        """Test that requests queued briefly are served"""
+        res = self.client.get(TAGS_URL,
+                              HTTP_X_REQUEST_START=request_start(1, 1000))
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_sheds_queued_requests(self):
+        """Test that requests queued too long get 503 and Retry-After"""
+        res = self.client.get(TAGS_URL,
+                              HTTP_X_REQUEST_START=request_start(3, 1000))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], '3')
+        self.assertEqual(self.shed_count('queue'), 1)
+
+    @override_settings(REQUEST_DEADLINE=dict(DEADLINE, MAX_QUEUE_TIME=0,
+                                             DEFAULT=1))
+    def test_sheds_requests_past_their_budget(self):
+        """Test that requests queued for their whole budget are shed"""
+        res = self.client.get(TAGS_URL,
+                              HTTP_X_REQUEST_START=request_start(1.5))
+
+        self.assertEqual(res.status_code, 503)
+
+    def test_sheds_excess_requests(self):
+        """Test that requests above the in-flight limit are shed"""
+        # Two requests already being served by other threads
+        deadline.IN_FLIGHT.enter()
+        deadline.IN_FLIGHT.enter()
+        self.addCleanup(deadline.IN_FLIGHT.exit)
+        self.addCleanup(deadline.IN_FLIGHT.exit)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(self.shed_count('in_flight'), 1)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 200)
+
+    def test_statement_timeout_answers_503(self):
+        """Test that a cancelled query gives 503 instead of 500"""
+        middleware = deadline.DeadlineMiddleware(lambda request: None)
+
+        res = middleware.process_exception(RequestFactory().get(TAGS_URL),
+                                           query_canceled())
+
+        self.assertEqual(res.status_code, 503)
+        self.assertIsNone(middleware.process_exception(
+            RequestFactory().get(TAGS_URL), OperationalError('gone away')
+        ))
+
+    def test_route_budget(self):
+        """Test that the budget of a route overrides the default"""
+        middleware = deadline.DeadlineMiddleware(lambda request: None)
+
+        self.assertEqual(middleware.get_budget(resolve(TAGS_URL)), 5)
+        self.assertEqual(middleware.get_budget(
+            resolve(reverse('recipe:tag-bulk'))
+        ), 30)
+
+    def timed_request(self, middleware, url):
+        request = RequestFactory().get(url)
+        request.resolver_match = resolve(url)
+        request.received_at = time.monotonic()
+        request.statement_timeouts = {'default': deadline.StatementTimeout()}
+        middleware.process_view(request, None, (), {})
+        return request.statement_timeouts['default']
+
+    @override_settings(REQUEST_DEADLINE=dict(DEADLINE, STATEMENT_TIMEOUT=10))
+    def test_keeps_shorter_server_timeout(self):
+        """Test that budgets longer than the server's timeout set nothing"""
+        middleware = deadline.DeadlineMiddleware(lambda request: None)
+
+        self.assertIsNotNone(self.timed_request(middleware, TAGS_URL).deadline)
+        self.assertIsNone(self.timed_request(
+            middleware, reverse('recipe:tag-bulk')
+        ).deadline)
+
+    @override_settings(REQUEST_DEADLINE=dict(DEADLINE, STATEMENT_TIMEOUT=5))
+    def test_no_wrappers_without_shorter_budgets(self):
+        middleware = deadline.DeadlineMiddleware(lambda request: None)
+
+        self.assertFalse(middleware.sets_timeouts)
+
+    def test_resets_kept_connections_only(self):
+        """Test that closed or pooled connections are not SET back"""
+        middleware = deadline.DeadlineMiddleware(lambda request: None)
+        timeout = deadline.StatementTimeout()
+        timeout.applied = True
+
+        for max_age, resets in ((0, False), (None, True), (60, True)):
+            connection = mock.MagicMock(settings_dict={
+                'CONN_MAX_AGE': max_age
+            })
+            with mock.patch.object(deadline, 'connections',
+                                   {'default': connection}):
+                middleware.reset({'default': timeout})
+            self.assertEqual(connection.cursor.called, resets)
+
+    def test_streamed_responses_reset_once_closed(self):
+        """Test that the body of a streamed response keeps the timeout"""
+        for response, reset_before_close in (
+                (HttpResponse(), True),
+                (StreamingHttpResponse(iter([b'a'])), False)):
+            middleware = deadline.DeadlineMiddleware(lambda request: response)
+            with mock.patch.object(middleware, 'reset') as reset:
+                returned = middleware(RequestFactory().get(TAGS_URL))
+                self.assertEqual(reset.called, reset_before_close)
+                returned.close()
+            self.assertEqual(reset.call_count, 1)
+
+
+class StatementTimeoutTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        REGISTRY.reset()
+
+    def execute(self, sql, params, many, context):
+        self.calls.append((sql, params))
+        if sql == 'SELECT pg_sleep(10)':
+            raise query_canceled()
+
+    def test_sets_time_left_once(self):
+        """Test that the time left is set before the first query only"""
+        timeout = deadline.StatementTimeout()
+        timeout.deadline = time.monotonic() + 2
+
+        timeout(self.execute, 'SELECT 1', None, False, {})
+        timeout(self.execute, 'SELECT 2', None, False, {})
+
+        (sql, (milliseconds,)), first, second = self.calls
+        self.assertEqual(sql, 'SET statement_timeout = %s')
+        self.assertTrue(1900 < milliseconds <= 2000)
+        self.assertEqual([first[0], second[0]], ['SELECT 1', 'SELECT 2'])
+
+    def test_no_deadline(self):
+        """Test that requests outside the namespaces are not limited"""
+        timeout = deadline.StatementTimeout()
+
+        timeout(self.execute, 'SELECT 1', None, False, {})
+
+        self.assertEqual(self.calls, [('SELECT 1', None)])
+
+    def test_counts_timeouts(self):
+        """Test that cancelled queries are counted by route"""
+        timeout = deadline.StatementTimeout()
+        timeout.deadline = time.monotonic() + 1
+        timeout.route = 'recipe:tag-list'
+
+        with self.assertRaises(OperationalError):
+            timeout(self.execute, 'SELECT pg_sleep(10)', None, False, {})
+
+        self.assertEqual(REGISTRY.snapshot()[
+            ('db_statement_timeouts_total', ('recipe:tag-list',))
+        ], 1)
@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.deletion import delete_in_chunks, request_user_deletion
+from core.models import Tag, UserDeletion
+
+ME_URL = reverse('user:me')
+
+
+@override_settings(USER_DELETION={'CHUNK_SIZE': 2, 'SYNC': False})
+class UserDeletionTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@gmail.com',
+                                                         'testpass')
+        self.token = Token.objects.create(user=self.user)
+        Tag.objects.bulk_create(Tag(user=self.user, name='Tag %d' % i)
+                                for i in range(5))
+
+    def test_user_deactivated_immediately(self):
+        """Test that the user can't authenticate once deletion is asked"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+        request_user_deletion(self.user)
+
+        self.assertEqual(client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 5)
+        self.assertTrue(UserDeletion.objects.filter(
+            user_id=self.user.pk, finished_at__isnull=True).exists())
+
+    def test_drain_deletes_in_chunks(self):
+        """Test that pending deletions are finished by the command"""
+        request_user_deletion(self.user)
+        out = StringIO()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('drain_deletions', verbose_progress=True,
+                         stdout=out)
+
+        chunks = [query['sql'] for query in queries
+                  if query['sql'].startswith('DELETE FROM "core_tag" WHERE '
+                                             '"core_tag"."id" IN')]
+        self.assertEqual(len(chunks), 3)
+
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+        self.assertFalse(Tag.objects.exists())
+        deletion = UserDeletion.objects.get(user_id=self.user.pk)
+        self.assertIsNotNone(deletion.finished_at)
+        self.assertEqual((deletion.tokens_deleted, deletion.tags_deleted),
+                         (1, 5))
+        self.assertIn('1 tokens, 4 tags so far', out.getvalue())
+
+    @override_settings(USER_DELETION={'CHUNK_SIZE': 2, 'SYNC': True})
+    def test_delete_me(self):
+        """Test that DELETE /me/ answers 202 and removes the account"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+
+    def test_admin_delete(self):
+        """Test that the admin schedules the deletion"""
+        admin = get_user_model().objects.create_superuser('admin@gmail.com',
+                                                          'password1234')
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:core_user_delete', args=[self.user.pk])
+
+        self.assertEqual(client.get(url).status_code, 200)
+        client.post(url, {'post': 'yes'})
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(UserDeletion.objects.filter(
+            user_id=self.user.pk).exists())
+
+
+class ChunkTransactionTests(TransactionTestCase):
+
+    def test_chunks_committed_before_yield(self):
+        """Test that no transaction is left open between the chunks"""
+        user = get_user_model().objects.create_user('test@gmail.com',
+                                                    'testpass')
+        Tag.objects.bulk_create(Tag(user=user, name='Tag %d' % i)
+                                for i in range(5))
+        counts = []
+
+        for count in delete_in_chunks(Tag.objects.filter(user=user), 2):
+            self.assertFalse(connection.in_atomic_block)
+            counts.append(count)
+
+        self.assertEqual(counts, [2, 2, 1])
@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase
+
+from rest_framework.exceptions import ValidationError
+
+from core.fields import parse_fields, sparse_serializer
+from core.models import Tag
+
+from recipe.serializers import TagSerializer
+
+
+class SparseFieldsTests(SimpleTestCase):
+
+    def test_parse_fields_keeps_declared_order(self):
+        """Test that the selection follows the serializer's order"""
+        self.assertEqual(parse_fields(' name,id,name ', ('id', 'name')),
+                         ('id', 'name'))
+
+    def test_parse_fields_rejects_unknown(self):
+        """Test that unknown or missing names are errors"""
+        for value in ('id,secret', ', ,'):
+            with self.assertRaises(ValidationError):
+                parse_fields(value, ('id', 'name'))
+
+    def test_sparse_serializer_built_once(self):
+        """Test that each combination gets a single serializer class"""
+        serializer_class = sparse_serializer(TagSerializer, ('name',))
+
+        self.assertIs(sparse_serializer(TagSerializer, ('name',)),
+                      serializer_class)
+        self.assertTrue(issubclass(serializer_class, TagSerializer))
+        self.assertEqual(serializer_class(Tag(id=1, name='Vegan')).data,
+                         {'name': 'Vegan'})
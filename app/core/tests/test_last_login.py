@@ -0,0 +1,89 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from core import last_login
+from core.last_login import LastLoginBuffer
+
+TOKEN_URL = reverse('user:token')
+
+
+class LastLoginBufferTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@gmail.com',
+                                                         'testpass')
+        self.other = get_user_model().objects.create_user('other@gmail.com',
+                                                          'testpass')
+        self.buffer = LastLoginBuffer(flush_interval=None, batch_size=1)
+
+    def test_flush_writes_latest_login(self):
+        """Test that only the most recent login of a user is written"""
+        now = timezone.now()
+        self.buffer.record(self.user.pk, now)
+        self.buffer.record(self.user.pk, now - timedelta(minutes=1))
+        self.buffer.record(self.other.pk, now)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, now)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_flush_never_moves_back(self):
+        """Test that a newer last_login written elsewhere is kept"""
+        now = timezone.now()
+        self.user.last_login = now
+        self.user.save()
+
+        self.buffer.record(self.user.pk, now - timedelta(minutes=1))
+        self.buffer.flush()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, now)
+
+    @override_settings(LAST_LOGIN_BUFFER={'ENABLED': True})
+    def test_token_records_login(self):
+        """Test that issuing a token buffers the login when enabled"""
+        with mock.patch.object(last_login, '_buffer', self.buffer):
+            res = APIClient().post(TOKEN_URL, {'email': 'test@gmail.com',
+                                               'password': 'testpass'})
+
+        self.assertIn('token', res.data)
+        self.assertEqual(len(self.buffer), 1)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        self.buffer.flush()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_session_login_writes_without_buffer(self):
+        """Test that logins update last_login right away when disabled"""
+        with mock.patch.object(last_login, '_buffer', self.buffer):
+            Client().login(email='test@gmail.com', password='testpass')
+
+        self.assertEqual(len(self.buffer), 0)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_token_does_not_write_user(self):
+        """Test that without the buffer issuing a token leaves the user"""
+        with CaptureQueriesContext(connection) as queries:
+            res = APIClient().post(TOKEN_URL, {'email': 'test@gmail.com',
+                                               'password': 'testpass'})
+
+        self.assertIn('token', res.data)
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('UPDATE')])
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
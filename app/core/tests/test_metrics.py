@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+
+TAGS_URL = reverse('recipe:tag-list')
+METRICS_URL = reverse('metrics')
+
+
+class RegistryTests(TestCase):
+    """Test the metrics registry and its text rendering"""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.counter = self.registry.counter('hits_total', 'Hits', ('route',))
+        self.histogram = self.registry.histogram('latency', 'Latency',
+                                                 ('route',), buckets=(1, 5))
+
+    def test_counter_rendering(self):
+        """Test that counters are summed per label set"""
+        self.counter.inc(('a',))
+        self.counter.inc(('a',), 2)
+        self.counter.inc(('b',))
+
+        text = self.registry.render()
+
+        self.assertIn('# TYPE hits_total counter', text)
+        self.assertIn('hits_total{route="a"} 3', text)
+        self.assertIn('hits_total{route="b"} 1', text)
+
+    def test_histogram_rendering(self):
+        """Test that buckets are cumulative and sum/count are reported"""
+        for value in (0.5, 3, 10):
+            self.histogram.observe(('a',), value)
+
+        text = self.registry.render()
+
+        self.assertIn('latency_bucket{route="a",le="1"} 1', text)
+        self.assertIn('latency_bucket{route="a",le="5"} 2', text)
+        self.assertIn('latency_bucket{route="a",le="+Inf"} 3', text)
+        self.assertIn('latency_sum{route="a"} 13.5', text)
+        self.assertIn('latency_count{route="a"} 3', text)
+
+    def test_threads_are_merged(self):
+        """Test that the per-thread shards add up"""
+        def work():
+            for _ in range(1000):
+                self.counter.inc(('a',))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.registry.snapshot()[('hits_total', ('a',))],
+                         4000)
+
+    def test_finished_threads_are_folded(self):
+        """Test that shards do not pile up with short lived threads"""
+        for _ in range(50):
+            thread = threading.Thread(target=self.counter.inc, args=(('a',),))
+            thread.start()
+            thread.join()
+        self.histogram.observe(('a',), 2)
+
+        self.assertLessEqual(len(self.registry._shards), 2)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot[('hits_total', ('a',))], 50)
+        self.assertEqual(snapshot[('latency', ('a',))], [0, 1, 0, 2, 1])
+        self.assertEqual(len(self.registry._shards), 1)
+
+    def test_processes_are_merged(self):
+        """Test that the dumps of other processes are added"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'metrics-1.json'), 'w') as fp:
+            json.dump([['hits_total', ['a'], 5],
+                       ['latency', ['a'], [1, 0, 0, 0.5, 1]]], fp)
+        self.counter.inc(('a',))
+
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            self.registry.flush()
+            text = self.registry.render()
+
+        self.assertIn('hits_total{route="a"} 6', text)
+        self.assertIn('latency_count{route="a"} 1', text)
+        self.assertTrue(os.path.exists(self.registry.dump_path(directory)))
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Test that API requests are measured and exposed"""
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_request_is_recorded(self):
+        """Test that a tags request shows up on /metrics"""
+        self.client.get(TAGS_URL)
+
+        text = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn('http_requests_total{route="recipe:tag-list",'
+                      'method="GET",status="200"} 1', text)
+        self.assertIn('db_queries_per_request_count{route="recipe:tag-list",'
+                      'method="GET"} 1', text)
+        self.assertIn('http_response_size_bytes_count{route='
+                      '"recipe:tag-list",method="GET"} 1', text)
+
+    def test_other_namespaces_are_ignored(self):
+        """Test that routes outside the API are not recorded"""
+        self.client.get(METRICS_URL)
+
+        text = self.client.get(METRICS_URL).content.decode()
+
+        self.assertNotIn('route=', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test that the token is required when configured"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
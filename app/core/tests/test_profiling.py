@@ -0,0 +1,93 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.profiling import SamplingProfilerMiddleware, sign_profile_header
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SamplingProfilerTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = get_user_model().objects.create_user('test@gmail.com',
+                                                         'testpass')
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    def get_tags(self, sample_rate, max_profiles=None, **extra):
+        with override_settings(PROFILER={'DIR': self.directory,
+                                         'SAMPLE_RATE': sample_rate,
+                                         'MAX_PROFILES': max_profiles}):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            return client.get(TAGS_URL, **extra)
+
+    def dumps(self, pattern):
+        return glob.glob(os.path.join(self.directory, 'recipe_tag-list',
+                                      pattern))
+
+    def test_disabled_without_directory(self):
+        """Test that the middleware drops out of the stack when off"""
+        with override_settings(PROFILER={'DIR': None}):
+            with self.assertRaises(MiddlewareNotUsed):
+                SamplingProfilerMiddleware(lambda request: None)
+
+    def test_sampled_request_dumped_with_sql(self):
+        """Test that a sampled request leaves a profile and its SQL"""
+        self.get_tags(1)
+
+        self.assertEqual(len(self.dumps('*.prof')), 1)
+        with open(self.dumps('*.sql.json')[0]) as fp:
+            info = json.load(fp)
+        self.assertEqual(info['route'], 'recipe:tag-list')
+        self.assertEqual(info['status'], 200)
+        self.assertTrue(any('core_tag' in query['sql']
+                            for query in info['queries']))
+
+    def test_oldest_profiles_deleted(self):
+        """Test that only the MAX_PROFILES most recent dumps are kept"""
+        self.get_tags(1)
+        first = self.dumps('*')
+
+        for _ in range(2):
+            self.get_tags(1, max_profiles=2)
+
+        self.assertEqual(len(self.dumps('*.prof')), 2)
+        self.assertEqual(len(self.dumps('*.sql.json')), 2)
+        self.assertFalse(set(first) & set(self.dumps('*')))
+
+    def test_signed_header(self):
+        """Test that only correctly signed headers force profiling"""
+        self.get_tags(0, HTTP_X_PROFILE='forged')
+        self.assertEqual(self.dumps('*.prof'), [])
+
+        self.get_tags(0, HTTP_X_PROFILE=sign_profile_header())
+        self.assertEqual(len(self.dumps('*.prof')), 1)
+
+    def test_report(self):
+        """Test that the report lists hot functions and statements"""
+        self.get_tags(1)
+        self.get_tags(1)
+        out = StringIO()
+
+        call_command('profile_report', dir=self.directory, top=5,
+                     stdout=out)
+
+        report = out.getvalue()
+        self.assertIn('GET recipe:tag-list', report)
+        self.assertIn('function calls', report)
+        self.assertIn('core_tag', report)
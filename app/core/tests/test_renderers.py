@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+
+    @skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_same_bytes_as_json_renderer(self):
+        """Test that the output matches the stock renderer byte for byte"""
+        data = [
+            OrderedDict([('id', 1), ('name', 'Vegan')]),
+            {'id': 2, 'name': 'Crème brûlée   "quoted" \\  '},
+            {'id': 3, 'name': 'line\u2028sep', 'extra': [None, True, False]},
+        ]
+
+        with mock.patch.object(renderers.orjson, 'dumps',
+                               wraps=renderers.orjson.dumps) as dumps:
+            rendered = FastJSONRenderer().render(data)
+
+        self.assertTrue(dumps.called)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+
+    def test_non_string_keys_fall_back(self):
+        """Test that the integer keys of bulk errors render as strings"""
+        data = OrderedDict([
+            ('ids', [1, 2]),
+            ('errors', {2: {'name': ['This field may not be blank.']}}),
+        ])
+
+        self.assertEqual(FastJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data),
+                         b'{"ids":[1,2],"errors":{"2":{"name":'
+                         b'["This field may not be blank."]}}}')
+
+    def test_indent_falls_back(self):
+        """Test that indented output is produced by the stock renderer"""
+        data = {'id': 1, 'name': 'Vegan'}
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(FastJSONRenderer().render(data, media_type),
+                         JSONRenderer().render(data, media_type))
+
+    def test_none(self):
+        """Test that no data renders an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
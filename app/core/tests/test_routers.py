@@ -0,0 +1,165 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory, \
+    TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db.routers import ReplicaMiddleware, ReplicaRouter, \
+    primary_reads, replicas_enabled, set_replicas_enabled
+from core.models import Tag
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'],
+                   REPLICA_NAMESPACES=('user', 'recipe'),
+                   REPLICA_PIN_SECONDS=5, REPLICA_PIN_CACHE='default')
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.addCleanup(set_replicas_enabled, False)
+        self.addCleanup(cache.clear)
+
+    def run_request(self, method, path, **extra):
+        """Run the middleware around a view, return whether it used them"""
+        request = getattr(self.factory, method)(path, **extra)
+        request.resolver_match = resolve(path)
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(replicas_enabled())
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        middleware(request)
+        return seen[0]
+
+    def test_reads_and_writes_outside_requests_use_primary(self):
+        """Test that commands and shells are never routed to replicas"""
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+        self.assertEqual(self.router.db_for_write(Tag), 'default')
+
+    def test_replicas_never_migrated(self):
+        """Test that migrations only run on the primary"""
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    def test_safe_request_reads_replica(self):
+        """Test that a GET in the recipe namespace reads from a replica"""
+        self.assertTrue(self.run_request('get', TAGS_URL))
+        set_replicas_enabled(True)
+        self.assertIn(self.router.db_for_read(Tag), ('replica1', 'replica2'))
+        self.assertEqual(self.router.db_for_write(Tag), 'default')
+
+    def test_primary_reads(self):
+        """Test that the block reads the primary and restores the state"""
+        set_replicas_enabled(True)
+        with primary_reads():
+            self.assertEqual(self.router.db_for_read(Tag), 'default')
+        self.assertIn(self.router.db_for_read(Tag), ('replica1', 'replica2'))
+
+    def test_other_namespaces_read_primary(self):
+        """Test that the admin is not routed to replicas"""
+        self.assertFalse(self.run_request('get', reverse('admin:index')))
+
+    def test_write_pins_client_to_primary(self):
+        """Test read-your-writes after a PATCH from the same token"""
+        self.assertFalse(self.run_request('patch', ME_URL,
+                                          HTTP_AUTHORIZATION='Token a'))
+
+        self.assertFalse(self.run_request('get', ME_URL,
+                                          HTTP_AUTHORIZATION='Token a',
+                                          REMOTE_ADDR='10.0.0.2'))
+        self.assertTrue(self.run_request('get', ME_URL,
+                                         HTTP_AUTHORIZATION='Token b',
+                                         REMOTE_ADDR='10.0.0.2'))
+
+    def test_anonymous_write_pins_address(self):
+        """Test that logging in pins the address the token is used from"""
+        self.run_request('post', reverse('user:token'))
+
+        self.assertFalse(self.run_request('get', ME_URL,
+                                          HTTP_AUTHORIZATION='Token a'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'],
+                   REPLICA_NAMESPACES=('user', 'recipe'),
+                   REPLICA_PIN_SECONDS=5, REPLICA_PIN_CACHE='default')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Route requests through a second connection to the test database"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Set up after the test databases, the replica mirrors the primary
+        connections.databases['replica1'] = dict(
+            connections['default'].settings_dict, TEST={'MIRROR': 'default'}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.databases['replica1']
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@gmail.com',
+                                                         'testpass')
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(cache.clear)
+
+    def get_tags(self):
+        """GET the tags, return the SQL run on the primary and the replica"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica1']) as replica:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+        return ([query['sql'] for query in primary],
+                [query['sql'] for query in replica])
+
+    def test_safe_request_reads_replica(self):
+        """Test that listing the tags queries the replica only"""
+        primary, replica = self.get_tags()
+
+        self.assertTrue(any('core_tag' in sql for sql in replica))
+        self.assertFalse(any('core_tag' in sql for sql in primary))
+
+    def test_pinned_client_reads_primary(self):
+        """Test that a client reads the primary after creating a tag"""
+        res = self.client.post(TAGS_URL, {'name': 'Dessert'})
+        self.assertEqual(res.status_code, 201)
+        Tag.objects.filter(name='Dessert').delete()
+
+        primary, replica = self.get_tags()
+
+        self.assertTrue(any('core_tag' in sql for sql in primary))
+        self.assertEqual(replica, [])
+
+    def test_cache_fills_read_primary(self):
+        """Test that the cached token user and /me/ come from the primary"""
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica1']) as replica:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], 'test@gmail.com')
+        self.assertTrue(any('authtoken_token' in query['sql']
+                            for query in primary))
+        self.assertEqual(len(replica), 0)
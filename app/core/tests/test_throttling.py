@@ -0,0 +1,129 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.cache import LocalLRUCache
+from core.throttling import consume, get_lock, parse_rate
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(THROTTLE_CACHE={'BACKEND': 'local'}, THROTTLE_RATES={})
+class TokenBucketTests(TestCase):
+
+    def test_parse_rate(self):
+        """Test that rates are read as (bucket size, period in seconds)"""
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('5/hour'), (5, 3600))
+
+    def test_bucket_refills_over_time(self):
+        """Test that a burst empties the bucket and time refills it"""
+        with patch('core.throttling.time.time', return_value=1000):
+            self.assertEqual(consume('key', 2, 60), 0)
+            self.assertEqual(consume('key', 2, 60), 0)
+            self.assertAlmostEqual(consume('key', 2, 60), 30)
+        with patch('core.throttling.time.time', return_value=1030):
+            self.assertEqual(consume('key', 2, 60), 0)
+
+    def test_buckets_do_not_wait_for_each_other(self):
+        """Test that a slow store only holds up the same bucket"""
+        entered, released = threading.Event(), threading.Event()
+        store = LocalLRUCache()
+        get = store.get
+
+        def slow_get(key, default=None):
+            if key == 'slow':
+                entered.set()
+                released.wait(5)
+            return get(key, default)
+        store.get = slow_get
+        other = next(key for key in ('key %d' % i for i in range(100))
+                     if get_lock(key) is not get_lock('slow'))
+        waits = []
+
+        with patch.object(throttling, '_store', store):
+            slow = threading.Thread(target=consume, args=('slow', 2, 60))
+            slow.start()
+            entered.wait(5)
+            fast = threading.Thread(
+                target=lambda: waits.append(consume(other, 2, 60))
+            )
+            fast.start()
+            fast.join(1)
+            blocked = fast.is_alive()
+            released.set()
+            slow.join()
+            fast.join()
+
+        self.assertFalse(blocked)
+        self.assertEqual(waits, [0])
+
+
+@override_settings(THROTTLE_CACHE={'BACKEND': 'local'},
+                   THROTTLE_RATES={'create-user.ip': '2/hour',
+                                   'token.login': '1/min',
+                                   'tags.user': '1/min'})
+class ThrottledViewsTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_create_user_limited_per_ip(self):
+        """Test that signups over the limit get 429 with Retry-After"""
+        for i in range(2):
+            res = self.client.post(CREATE_USER_URL, {
+                'email': 'user%d@gmail.com' % i, 'password': 'testpass',
+                'name': 'Test'
+            })
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'user3@gmail.com', 'password': 'testpass', 'name': 'Test'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(int(res['Retry-After']), 1800)
+        self.assertFalse(get_user_model().objects.filter(
+            email='user3@gmail.com').exists())
+
+    def test_token_limited_per_email(self):
+        """Test that login attempts for one email are limited"""
+        get_user_model().objects.create_user('test@gmail.com', 'testpass')
+        payload = {'email': 'test@gmail.com', 'password': 'wrong'}
+        self.client.post(TOKEN_URL, payload)
+
+        res = self.client.post(TOKEN_URL, dict(payload,
+                                               email='TEST@gmail.com'))
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = self.client.post(TOKEN_URL, dict(payload,
+                                               email='other@gmail.com'))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_token_non_object_body(self):
+        """Test that a JSON array body is rejected by the serializer"""
+        res = self.client.post(TOKEN_URL, [], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_list_not_throttled(self):
+        """Test that only tag creation takes tokens"""
+        user = get_user_model().objects.create_user('test@gmail.com',
+                                                    'testpass')
+        self.client.force_authenticate(user)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(TAGS_URL).status_code,
+                         status.HTTP_200_OK)
+        res = self.client.post(TAGS_URL, {'name': 'Dessert'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
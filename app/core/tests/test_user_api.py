@@ -1,10 +1,14 @@
-from django.test import TestCase
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.metrics import REGISTRY
+from user.cache import get_cached_me
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -145,37 +149,79 @@ class PrivateUserApiTest(TestCase):
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_profile_cached_on_read(self):
+        """Test that the second GET is a cache hit"""
+        REGISTRY.reset()
+        self.client.get(ME_URL)
+        res = self.client.get(ME_URL)
 
+        self.assertEqual(res.data, {'name': 'name',
+                                    'email': 'test@londonappdev.com'})
+        totals = REGISTRY.snapshot()
+        self.assertEqual(totals[('user_me_cache_lookups_total', ('miss',))],
+                         1)
+        self.assertEqual(totals[('user_me_cache_lookups_total', ('hit',))],
+                         1)
 
+    def test_retrieve_profile_fields(self):
+        """Test that ?fields= limits the profile to the fields asked for"""
+        self.client.get(ME_URL)
 
+        res = self.client.get(ME_URL, {'fields': 'name'})
 
+        self.assertEqual(res.data, {'name': 'name'})
+        self.assertEqual(set(get_cached_me(self.user.pk)), {'email', 'name'})
 
+    def test_retrieve_profile_unknown_field(self):
+        """Test that fields outside the profile are rejected"""
+        res = self.client.get(ME_URL, {'fields': 'password'})
 
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class UserCacheWriteThroughTest(TransactionTestCase):
+    """Test that profile updates reach the cache once committed"""
 
+    def setUp(self):
+        self.user = create_user(
+            email='test@londonappdev.com',
+            password='testpass',
+            name='name'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
 
+    def test_update_rewrites_cache(self):
+        """Test that a PATCH replaces the cached profile"""
+        self.client.get(ME_URL)
 
+        self.client.patch(ME_URL, {'name': 'newName'})
 
+        self.assertEqual(get_cached_me(self.user.pk)['name'], 'newName')
+        self.assertEqual(self.client.get(ME_URL).data['name'], 'newName')
 
+    def test_update_profile_fields(self):
+        """Test that ?fields= trims the answer but not the cached profile"""
+        res = self.client.patch(ME_URL + '?fields=email', {'name': 'new'})
 
+        self.assertEqual(res.data, {'email': 'test@londonappdev.com'})
+        self.assertEqual(get_cached_me(self.user.pk)['name'], 'new')
 
+    def test_cache_written_after_commit(self):
+        """Test that an uncommitted update is not cached"""
+        with transaction.atomic():
+            self.client.patch(ME_URL, {'name': 'newName'})
+            self.assertIsNone(get_cached_me(self.user.pk))
 
+        self.assertEqual(get_cached_me(self.user.pk)['name'], 'newName')
 
+    def test_cache_not_written_on_rollback(self):
+        """Test that a rolled back update leaves no cached profile"""
+        try:
+            with transaction.atomic():
+                self.client.patch(ME_URL, {'name': 'newName'})
+                raise RuntimeError
+        except RuntimeError:
+            pass
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        self.assertIsNone(get_cached_me(self.user.pk))
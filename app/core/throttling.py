@@ -0,0 +1,147 @@
+"""
+Token bucket throttles.
+
+A bucket holds up to N tokens and refills at N tokens per period, every
+request takes one token, so callers may burst N requests and then run at
+the sustained rate. Rates are set in settings.THROTTLE_RATES, keyed by the
+view's `throttle_scope` and the kind of throttle:
+
+    THROTTLE_RATES = {
+        'token.ip': '30/min',     # per client address
+        'token.login': '10/min',  # per email trying to log in
+        'me.user': '300/min',     # per authenticated user
+    }
+
+Scopes without a rate are not throttled. Buckets live in the store built
+from settings.THROTTLE_CACHE, a 'local' store is per process while a
+'django' one is shared through the cache server (without atomic updates,
+concurrent workers may let a few extra requests through). Within a
+process the updates of a bucket are serialized by one of LOCK_STRIPES
+locks, requests for other buckets do not wait on its cache round trips.
+"""
+import hashlib
+import threading
+import time
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.throttling import BaseThrottle
+
+from core.cache import build_store
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+LOCK_STRIPES = 64
+
+_store = None
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as '10/min'
+    :param rate: (str) '<requests>/<second|minute|hour|day>'
+    :return: (int, int) bucket size and refill period in seconds
+    """
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def get_throttle_store():
+    """Return the store holding the buckets"""
+    global _store
+    if _store is None:
+        _store = build_store(settings.THROTTLE_CACHE, key_prefix='throttle:')
+    return _store
+
+
+def get_lock(key):
+    """Return the lock serializing the updates of a bucket"""
+    return _locks[hash(key) % LOCK_STRIPES]
+
+
+@receiver(setting_changed)
+def reset_throttle_store(**kwargs):
+    global _store
+    if kwargs['setting'] in ('THROTTLE_CACHE', 'THROTTLE_RATES'):
+        _store = None
+
+
+def consume(key, capacity, period):
+    """
+    Take a token out of the bucket stored under key
+    :return: (float) 0 when a token was available, otherwise the seconds
+             until the next one
+    """
+    store = get_throttle_store()
+    refill = capacity / period
+    # Wall clock time, buckets may be shared by several hosts
+    now = time.time()
+    with get_lock(key):
+        tokens, updated = store.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens >= 1:
+            # An untouched bucket is full again after one period
+            store.set(key, (tokens - 1, now), period)
+            return 0
+        store.set(key, (tokens, now), period)
+    return (1 - tokens) / refill
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class, subclasses set `kind` and implement get_key()"""
+    kind = None
+
+    def get_key(self, request, view):
+        """Return what identifies the caller, None to skip the check"""
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        scope = getattr(view, 'throttle_scope', None)
+        rate = settings.THROTTLE_RATES.get('%s.%s' % (scope, self.kind))
+        if rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self.wait_time = consume('%s.%s:%s' % (scope, self.kind, key),
+                                 capacity, period)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle by client address, honouring NUM_PROXIES"""
+    kind = 'ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle authenticated users by id"""
+    kind = 'user'
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class LoginTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle login attempts by the submitted email, whatever the address"""
+    kind = 'login'
+
+    def get_key(self, request, view):
+        # Malformed bodies are left to the serializer
+        if not isinstance(request.data, Mapping):
+            return None
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        return hashlib.md5(email.strip().lower().encode()).hexdigest()
@@ -0,0 +1,174 @@
+import io
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext as _
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.metrics import LATENCY, REGISTRY, REQUESTS
+from user.cache import invalidate_me
+
+
+def metrics(request):
+    """Expose the collected metrics in the Prometheus text format"""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
+
+
+class RolledBack(Exception):
+    """Raised to roll back an atomic batch after a failed sub-request"""
+
+
+class BatchView(APIView):
+    """
+    Run several API calls in one request:
+
+        {"atomic": false, "requests": [
+            {"method": "GET", "path": "/api/user/me/"},
+            {"method": "POST", "path": "/api/recipe/tags/",
+             "body": {"name": "Vegan"}}
+        ]}
+
+    The caller is authenticated once, every sub-request runs in-process
+    as the same user, in order, and the answer lists their status, headers
+    and body. With "atomic" the batch runs in one transaction, rolled back
+    (and the remaining requests skipped with 424) at the first 4xx or 5xx.
+
+    The middleware sees the batch as one request of the batch namespace:
+    its deadline bounds all the calls, which read from the primary. Each
+    call is still measured under its own route.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    methods = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+    # Copied from the batch request into the sub-requests
+    environ_keys = ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST',
+                    'HTTP_AUTHORIZATION', 'HTTP_ACCEPT_LANGUAGE',
+                    'HTTP_X_FORWARDED_FOR', 'wsgi.url_scheme')
+
+    def post(self, request):
+        items = self.validate(request.data)
+        atomic = bool(request.data.get('atomic'))
+        if not atomic:
+            return self.answer([self.run(request, *item) for item in items],
+                               committed=True)
+
+        responses = []
+        try:
+            with transaction.atomic():
+                for item in items:
+                    responses.append(self.run(request, *item))
+                    if responses[-1]['status'] >= 400:
+                        raise RolledBack()
+        except RolledBack:
+            # Caches written by the rolled back requests are wrong now
+            invalidate_me([request.user.pk])
+            skipped = self.error(status.HTTP_424_FAILED_DEPENDENCY,
+                                 _('Not run, the batch was rolled back'))
+            responses += [skipped] * (len(items) - len(responses))
+            return self.answer(responses, committed=False)
+        return self.answer(responses, committed=True)
+
+    def answer(self, responses, committed):
+        return Response(OrderedDict([
+            ('committed', committed),
+            ('responses', responses),
+        ]))
+
+    def validate(self, data):
+        """Return [(method, path, body)] of the sub-requests"""
+        items = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ValidationError(_('Expected a non empty list of requests'))
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            raise ValidationError(_('At most %d requests per batch')
+                                  % settings.BATCH_MAX_REQUESTS)
+        validated = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or \
+                    not isinstance(item.get('path'), str):
+                raise ValidationError({index: _('Expected a path')})
+            method = str(item.get('method', 'GET')).upper()
+            if method not in self.methods:
+                raise ValidationError({index: _('Unsupported method')})
+            validated.append((method, item['path'], item.get('body')))
+        return validated
+
+    def error(self, status_code, detail):
+        return OrderedDict([('status', status_code), ('headers', {}),
+                            ('body', {'detail': detail})])
+
+    def run(self, request, method, path, body):
+        """Run one sub-request, return its status, headers and body"""
+        url = urlsplit(path)
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            match = None
+        if match is None or match.namespace not in settings.BATCH_NAMESPACES:
+            return self.error(status.HTTP_404_NOT_FOUND, _('Not found.'))
+
+        content = b'' if body is None else json.dumps(body).encode()
+        environ = {key: request.META[key] for key in self.environ_keys
+                   if key in request.META}
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'HTTP_ACCEPT': 'application/json',
+            'wsgi.input': io.BytesIO(content),
+        })
+        sub_request = WSGIRequest(environ)
+        sub_request.resolver_match = match
+        # Picked up by DRF instead of authenticating the token again
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+
+        start = time.perf_counter()
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if match.namespace in settings.METRICS_NAMESPACES:
+            labels = (match.view_name, method)
+            LATENCY.observe(labels, time.perf_counter() - start)
+            REQUESTS.inc(labels + (str(response.status_code),))
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        if getattr(response, 'data', None) is not None:
+            data = response.data
+        elif content and response.get('Content-Type', '').startswith(
+                'application/json'):
+            data = json.loads(content.decode())
+        else:
+            data = content.decode() or None
+        return OrderedDict([
+            ('status', response.status_code),
+            ('headers', OrderedDict(
+                (name, value) for name, value in response.items()
+                if name not in ('Content-Type', 'Content-Length', 'Vary')
+            )),
+            ('body', data),
+        ])
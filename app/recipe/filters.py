@@ -0,0 +1,23 @@
+from rest_framework.filters import BaseFilterBackend
+
+
+class TagPrefixFilter(BaseFilterBackend):
+    """
+    Case-insensitive prefix match on the tag name, ?prefix=veg or
+    ?search=veg. On PostgreSQL the lookup is served by the
+    (user_id, UPPER(name) text_pattern_ops) index.
+    """
+    query_params = ('prefix', 'search')
+
+    def get_prefix(self, request):
+        for param in self.query_params:
+            value = request.query_params.get(param, '').strip()
+            if value:
+                return value
+        return None
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = self.get_prefix(request)
+        if prefix is None:
+            return queryset
+        return queryset.filter(name__istartswith=prefix)
@@ -0,0 +1,102 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TagCursorPagination(BasePagination):
+    """
+    Opt-in keyset pagination over (name, id) descending.
+
+    Pages are only produced when the client sends `cursor` or `page_size`,
+    otherwise the full list is returned as before. Each page continues
+    right after the last (name, id) of the previous one so fetching a deep
+    page costs the same index range scan as fetching the first one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    ordering = ('-name', '-id')
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (self.cursor_query_param not in params and
+                self.page_size_query_param not in params):
+            return None
+
+        self.request = request
+        columns = getattr(view, 'row_columns', ('id', 'name'))
+        self.name_index = columns.index('name')
+        self.id_index = columns.index('id')
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            name, pk = position
+            # name <= bound gives the index range, the rest only trims ties
+            queryset = queryset.filter(
+                Q(name__lte=name) & (Q(name__lt=name) | Q(id__lt=pk))
+            )
+
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.get_position(rows[-1]) \
+            if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_position(self, row):
+        """
+        Return the (name, id) sort key of a row, its columns are listed by
+        the row_columns of the view, (id, name) by default
+        """
+        return row[self.name_index], row[self.id_index]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            name, pk = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')).decode()
+            )
+            return str(name), int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(list(position)).encode()
+        ).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param,
+                                  self.page_size)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
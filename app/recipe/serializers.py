@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from core.models import Tag
 
+
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for tag objects"""
 
@@ -8,4 +9,24 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ('id', 'name')
         read_only_fields = ('id', )
-        # extra_kwargs:
\ No newline at end of file
+        # extra_kwargs:
+
+
+TAG_FIELDS = TagSerializer.Meta.fields
+
+
+def serialize_tag_rows(rows, fields=TAG_FIELDS):
+    """
+    Fast read path of the tag list: build TagSerializer's output from
+    (id, name) rows without model instances or field machinery
+    :param fields: (tuple) the leading columns of the rows, any
+                   column after them is left out
+    """
+    return list(iter_tag_rows(rows, fields))
+
+
+def iter_tag_rows(rows, fields=TAG_FIELDS):
+    """Lazy variant of serialize_tag_rows, for streamed responses"""
+    if fields == TAG_FIELDS:
+        return ({'id': pk, 'name': name} for pk, name in rows)
+    return (dict(zip(fields, row)) for row in rows)
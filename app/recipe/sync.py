@@ -0,0 +1,79 @@
+"""
+Delta sync of the tag list.
+
+GET tags/?since= returns every live tag along with a sync token, later
+calls with ?since=<token> only return the tags created or renamed since
+then, the ids of the deleted ones and a new token:
+
+    {"since": "<token>", "changes": [{"id": 1, "name": "Vegan"}],
+     "deleted": [2]}
+
+Tokens hold the time the previous sync started. Rows are stamped by the
+application servers before their transaction commits, so changes are
+looked up from TAG_SYNC_OVERLAP seconds earlier than the token to catch
+late commits and clock skew; clients apply changes idempotently and may
+see a few of them twice.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+invalid_token_message = _('Invalid sync token')
+
+
+def encode_sync_token(moment):
+    """Return the opaque token of an aware datetime"""
+    micros = int(moment.timestamp() * 1000000)
+    return base64.urlsafe_b64encode(
+        json.dumps([micros]).encode()
+    ).decode('ascii')
+
+
+def decode_sync_token(token):
+    """Return the aware datetime of a token, None for an empty token"""
+    if not token:
+        return None
+    try:
+        micros, = json.loads(
+            base64.urlsafe_b64decode(token.encode('ascii')).decode()
+        )
+        return datetime.fromtimestamp(int(micros) / 1000000,
+                                      tz=timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError, UnicodeError,
+            binascii.Error):
+        raise ValidationError({'since': [invalid_token_message]})
+
+
+def sync_tags(queryset, token):
+    """
+    Build the sync answer from the tags of a user, tombstones included
+    :param queryset: (QuerySet) every tag of the user
+    :param token: (str) the ?since= value, empty for a full sync
+    :return: (OrderedDict)
+    """
+    started = timezone.now()
+    since = decode_sync_token(token)
+    if since is None:
+        rows = queryset.filter(deleted_at__isnull=True)
+    else:
+        overlap = timedelta(seconds=settings.TAG_SYNC_OVERLAP)
+        rows = queryset.filter(updated_at__gte=since - overlap)
+    changes, deleted = [], []
+    for pk, name, deleted_at in rows.order_by('id').values_list(
+            'id', 'name', 'deleted_at'):
+        if deleted_at is None:
+            changes.append({'id': pk, 'name': name})
+        else:
+            deleted.append(pk)
+    return OrderedDict([
+        ('since', encode_sync_token(started)),
+        ('changes', changes),
+        ('deleted', deleted),
+    ])
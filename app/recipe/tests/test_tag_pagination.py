@@ -0,0 +1,112 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class TagPaginationTests(TestCase):
+    """Test the keyset pagination of the tags list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_tags(self, count, name='Tag %05d'):
+        Tag.objects.bulk_create(
+            Tag(user=self.user, name=name % i) for i in range(count)
+        )
+
+    def fetch_all(self, page_size):
+        """Walk every page and return the names in order"""
+        names = []
+        res = self.client.get(TAGS_URL, {'page_size': page_size})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            names += [tag['name'] for tag in res.data['results']]
+            if not res.data['next']:
+                return names
+            res = self.client.get(res.data['next'])
+
+    def test_not_paginated_by_default(self):
+        """Test that the plain list is kept when no page is requested"""
+        self.create_tags(3)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+
+    def test_pages_cover_every_tag_once(self):
+        """Test that walking the pages returns all tags in list order"""
+        self.create_tags(25)
+
+        names = self.fetch_all(page_size=7)
+
+        expected = list(Tag.objects.filter(user=self.user)
+                        .order_by('-name', '-id')
+                        .values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_case_variants_are_stable(self):
+        """Test that names differing only in case are all returned"""
+        variants = ['same', 'Same', 'SAME', 'sAme', 'saMe', 'samE', 'SAme',
+                    'sAMe', 'saME', 'SaMe']
+        Tag.objects.bulk_create(
+            Tag(user=self.user, name=name) for name in variants
+        )
+
+        names = self.fetch_all(page_size=3)
+
+        self.assertEqual(sorted(names), sorted(variants))
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected"""
+        res = self.client.get(TAGS_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_size_is_capped(self):
+        """Test that clients cannot request unbounded pages"""
+        self.create_tags(5)
+
+        res = self.client.get(TAGS_URL, {'page_size': 10 ** 6})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_deep_pages_cost_the_same(self):
+        """Test that a deep page is a bounded range read, not an offset"""
+        self.create_tags(3000)
+        first = self.client.get(TAGS_URL, {'page_size': 50})
+        deep_url = first.data['next']
+        for _ in range(40):
+            deep_url = self.client.get(deep_url).data['next']
+
+        timings = {}
+        for label, url, params in (('first', TAGS_URL, {'page_size': 50}),
+                                   ('deep', deep_url, None)):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(10):
+                    res = self.client.get(url, params)
+                timings[label] = time.perf_counter() - start
+            self.assertEqual(len(res.data['results']), 50)
+            self.assertEqual(len(queries), 10)
+            self.assertNotIn('OFFSET', queries[-1]['sql'].upper())
+
+        self.assertLess(timings['deep'], timings['first'] * 3 + 0.05)
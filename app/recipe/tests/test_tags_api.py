@@ -1,8 +1,15 @@
+import gzip
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from core.models import Tag
@@ -11,6 +18,12 @@ from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+BULK_TAGS_URL = reverse('recipe:tag-bulk')
+
+
+def detail_url(tag_id):
+    return reverse('recipe:tag-detail', args=[tag_id])
+
 
 class PublicTagsApiTEsts(TestCase):
     """Test the Publicly available tags Api"""
@@ -47,6 +60,17 @@ class PrivateTagsApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_retrieve_tags_same_bytes(self):
+        """Test that the list body matches TagSerializer's rendering"""
+        Tag.objects.create(user=self.user, name='Crème brûlée')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(TAGS_URL, HTTP_ACCEPT='application/json')
+
+        tags = Tag.objects.all().order_by('-name', '-id')
+        expected = JSONRenderer().render(TagSerializer(tags, many=True).data)
+        self.assertEqual(res.content, expected)
+
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user"""
         user = get_user_model().objects.create_user(
@@ -66,9 +90,51 @@ class PrivateTagsApiTest(TestCase):
         payload = {'name':"Vegan"}
         self.client.post(TAGS_URL, payload)
         exists = Tag.objects.filter(user=self.user,
-                                    name=payload['name '])
+                                    name=payload['name'])
         self.assertTrue(exists)
 
+    def test_create_existing_tag_returns_it(self):
+        """Test that creating a tag twice returns the first one with 200"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_same_name_other_user(self):
+        """Test that names are only unique per user"""
+        other = get_user_model().objects.create_user('other@gmail.com',
+                                                     'other')
+        Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_idempotency_key_replays_response(self):
+        """Test that a retried request gets the first response back"""
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'retry-1'}
+        first = self.client.post(TAGS_URL, {'name': 'Vegan'}, **headers)
+
+        Tag.objects.all().delete()
+        retry = self.client.post(TAGS_URL, {'name': 'Vegan'}, **headers)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(Tag.objects.exists())
+
+    def test_idempotency_key_other_payload(self):
+        """Test that reusing a key for another payload is rejected"""
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'retry-2'}
+        self.client.post(TAGS_URL, {'name': 'Vegan'}, **headers)
+
+        res = self.client.post(TAGS_URL, {'name': 'Dessert'}, **headers)
+
+        self.assertEqual(res.status_code, 422)
+
     def test_create_tag_invalid(self):
         """Test creating an invalid tag raise an error"""
         payload = {'name':''}
@@ -76,3 +142,362 @@ class PrivateTagsApiTest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+class TagSearchApiTest(TestCase):
+    """Test the prefix search of the tags list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name in ('Vegan', 'vegetarian', 'Dessert', '100% Veg'):
+            Tag.objects.create(user=self.user, name=name)
+
+    def test_prefix_is_case_insensitive(self):
+        """Test that tags starting with the prefix in any case match"""
+        res = self.client.get(TAGS_URL, {'prefix': 'VEG'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['vegetarian', 'Vegan'])
+
+    def test_search_alias(self):
+        """Test that ?search= behaves like ?prefix="""
+        res = self.client.get(TAGS_URL, {'search': 'des'})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Dessert'])
+
+    def test_prefix_is_literal(self):
+        """Test that LIKE wildcards in the prefix are matched literally"""
+        res = self.client.get(TAGS_URL, {'prefix': '100%'})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['100% Veg'])
+        res = self.client.get(TAGS_URL, {'prefix': '_'})
+        self.assertEqual(res.data, [])
+
+    def test_prefix_limited_to_user(self):
+        """Test that other users' tags never match"""
+        other = get_user_model().objects.create_user('other@gmail.com',
+                                                     'other')
+        Tag.objects.create(user=other, name='Vegetables')
+
+        res = self.client.get(TAGS_URL, {'prefix': 'veg'})
+
+        self.assertEqual(len(res.data), 2)
+
+    def test_search_limit(self):
+        """Test that ?limit= caps the number of matches"""
+        res = self.client.get(TAGS_URL, {'prefix': 'veg', 'limit': 1})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['vegetarian'])
+
+    @override_settings(TAG_SEARCH_DEFAULT_LIMIT=1, TAG_SEARCH_MAX_LIMIT=1)
+    def test_search_limit_is_capped(self):
+        """Test that the default and maximum limits apply"""
+        res = self.client.get(TAGS_URL, {'prefix': 'veg'})
+        self.assertEqual(len(res.data), 1)
+
+        res = self.client.get(TAGS_URL, {'prefix': 'veg', 'limit': 50})
+        self.assertEqual(len(res.data), 1)
+
+
+class StreamingTagsApiTest(TestCase):
+    """Test the streamed tags list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            Tag.objects.create(user=self.user, name='Tag %d' % i)
+        tags = Tag.objects.all().order_by('-name', '-id')
+        self.expected = JSONRenderer().render(
+            TagSerializer(tags, many=True).data
+        )
+
+    @override_settings(TAG_STREAM_CHUNK_SIZE=2)
+    def test_stream_same_bytes(self):
+        """Test that ?stream=1 streams the regular body in chunks"""
+        res = self.client.get(TAGS_URL, {'stream': '1'},
+                              HTTP_ACCEPT='application/json')
+
+        self.assertTrue(res.streaming)
+        chunks = list(res.streaming_content)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks), self.expected)
+
+    def test_stream_empty_list(self):
+        """Test that an account without tags streams an empty array"""
+        Tag.objects.all().delete()
+
+        res = self.client.get(TAGS_URL, {'stream': '1'})
+
+        self.assertEqual(b''.join(res.streaming_content), b'[]')
+
+    def test_stream_gzip(self):
+        """Test that clients accepting gzip get a compressed stream"""
+        res = self.client.get(TAGS_URL, {'stream': 'true'},
+                              HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(
+            gzip.decompress(b''.join(res.streaming_content)), self.expected
+        )
+
+    @override_settings(TAG_LIST_STREAMING=True)
+    def test_stream_by_default(self):
+        """Test that the setting streams without ?stream= unless disabled"""
+        self.assertTrue(self.client.get(TAGS_URL).streaming)
+        res = self.client.get(TAGS_URL, {'stream': '0'})
+        self.assertFalse(res.streaming)
+        self.assertEqual(res.content, self.expected)
+
+
+class BulkTagsApiTest(TestCase):
+    """Test creating several tags in one request"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        """Test that every tag is created and its id returned"""
+        payload = [{'name': 'Vegan'}, {'name': 'Dessert'}, {'name': 'Fish'}]
+
+        res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(sorted(res.data['ids']),
+                         sorted(tag.id for tag in tags))
+        self.assertEqual(res.data['errors'], {})
+
+    def test_bulk_create_existing_and_repeated(self):
+        """Test that taken and repeated names return the same ids"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = [{'name': 'Vegan'}, {'name': 'Fish'}, {'name': 'Fish'}]
+
+        res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        fish = Tag.objects.get(user=self.user, name='Fish')
+        self.assertEqual(res.data['ids'], [tag.id, fish.id, fish.id])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_invalid_rejects_all(self):
+        """Test that one invalid item rejects the whole request"""
+        payload = [{'name': 'Vegan'}, {'name': ''}]
+
+        res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('name', res.data[1])
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_create_partial(self):
+        """Test that partial mode creates valid items and reports others"""
+        payload = [{'name': ''}, {'name': 'Vegan'}, {}]
+
+        res = self.client.post(BULK_TAGS_URL + '?partial=true', payload,
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['ids']), 1)
+        self.assertEqual(set(res.data['errors']), {0, 2})
+        tag = Tag.objects.get(user=self.user)
+        self.assertEqual(tag.name, 'Vegan')
+
+    def test_bulk_create_requires_list(self):
+        """Test that a single object is rejected"""
+        res = self.client.post(BULK_TAGS_URL, {'name': 'Vegan'},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TAG_BULK_CREATE_MAX_ITEMS=2)
+    def test_bulk_create_too_many(self):
+        """Test that oversized arrays are rejected"""
+        payload = [{'name': 'Tag %d' % i} for i in range(3)]
+
+        res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+
+    @skipUnlessDBFeature('can_return_ids_from_bulk_insert')
+    @override_settings(TAG_BULK_CREATE_BATCH_SIZE=2)
+    def test_bulk_create_is_batched(self):
+        """Test that rows are inserted batch_size at a time"""
+        payload = [{'name': 'Tag %d' % i} for i in range(3)]
+
+        with self.assertNumQueries(2):
+            res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(len(res.data['ids']), 3)
+
+
+class TagSyncApiTest(TestCase):
+    """Test deleting tags and syncing the changes with ?since="""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        # Changed long before the syncs below
+        Tag.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def sync(self, since=''):
+        res = self.client.get(TAGS_URL, {'since': since})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_delete_keeps_tombstone(self):
+        """Test that deleted tags leave the list but stay in the table"""
+        res = self.client.delete(detail_url(self.vegan.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.vegan.refresh_from_db()
+        self.assertIsNotNone(self.vegan.deleted_at)
+        self.assertEqual(self.client.get(TAGS_URL).data,
+                         [{'id': self.dessert.id, 'name': 'Dessert'}])
+        self.assertEqual(self.client.delete(detail_url(self.vegan.id))
+                         .status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_other_user_tag(self):
+        """Test that the tags of other users cannot be deleted"""
+        other = get_user_model().objects.create_user('other@gmail.com',
+                                                     'pass')
+        tag = Tag.objects.create(user=other, name='Fruity')
+
+        res = self.client.delete(detail_url(tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        tag.refresh_from_db()
+        self.assertIsNone(tag.deleted_at)
+
+    def test_create_revives_deleted_tag(self):
+        """Test that creating a deleted tag again brings it back"""
+        self.client.delete(detail_url(self.vegan.id))
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['id'], self.vegan.id)
+        self.vegan.refresh_from_db()
+        self.assertIsNone(self.vegan.deleted_at)
+
+    def test_full_sync(self):
+        """Test that an empty token returns every live tag"""
+        Tag.objects.filter(pk=self.vegan.pk).soft_delete()
+
+        data = self.sync()
+
+        self.assertEqual(data['changes'],
+                         [{'id': self.dessert.id, 'name': 'Dessert'}])
+        self.assertEqual(data['deleted'], [])
+        self.assertTrue(data['since'])
+
+    @override_settings(TAG_SYNC_OVERLAP=0)
+    def test_delta_sync(self):
+        """Test that a token only returns what changed after it"""
+        since = self.sync()['since']
+        self.client.delete(detail_url(self.vegan.id))
+        created = self.client.post(TAGS_URL, {'name': 'Fruity'}).data
+
+        data = self.sync(since)
+
+        self.assertEqual(data['changes'], [created])
+        self.assertEqual(data['deleted'], [self.vegan.id])
+        self.assertEqual(self.sync(data['since'])['changes'], [])
+
+    def test_delta_sync_overlap(self):
+        """Test that changes stamped just before the token are sent again"""
+        since = self.sync()['since']
+        Tag.objects.filter(pk=self.vegan.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        data = self.sync(since)
+
+        self.assertEqual(data['changes'],
+                         [{'id': self.vegan.id, 'name': 'Vegan'}])
+
+    def test_invalid_token(self):
+        """Test that a malformed token is rejected"""
+        res = self.client.get(TAGS_URL, {'since': 'not-a-token'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsTagsApiTest(TestCase):
+    """Test selecting the tag fields with ?fields="""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'mmolledo@gmail.com',
+            'mmolledo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+
+    def test_list_selected_fields(self):
+        """Test that only the selected columns are fetched and rendered"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL, {'fields': 'id'})
+
+        self.assertEqual(res.data, [{'id': self.vegan.id},
+                                    {'id': self.dessert.id}])
+        select = queries[-1]['sql'].split(' FROM ')[0]
+        self.assertNotIn('name', select)
+
+    def test_paginate_selected_fields(self):
+        """Test that pages of sparse rows still link to the next one"""
+        res = self.client.get(TAGS_URL, {'fields': 'name', 'page_size': 1})
+        self.assertEqual(res.data['results'], [{'name': 'Vegan'}])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.data['results'], [{'name': 'Dessert'}])
+        self.assertIsNone(res.data['next'])
+
+    @override_settings(TAG_LIST_STREAMING=True)
+    def test_stream_selected_fields(self):
+        """Test that streamed lists honour the selection too"""
+        res = self.client.get(TAGS_URL, {'fields': 'name'},
+                              HTTP_ACCEPT='application/json')
+
+        self.assertEqual(b''.join(res.streaming_content),
+                         b'[{"name":"Vegan"},{"name":"Dessert"}]')
+
+    def test_create_selected_fields(self):
+        """Test that ?fields= trims the created tag but not the input"""
+        res = self.client.post(TAGS_URL + '?fields=id', {'name': 'Fruity'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data,
+                         {'id': Tag.objects.get(name='Fruity').id})
+
+    def test_unknown_field(self):
+        """Test that unknown fields are rejected"""
+        res = self.client.get(TAGS_URL, {'fields': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
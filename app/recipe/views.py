@@ -1,26 +1,187 @@
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext as _
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
 
+from core.authentication import CachedTokenAuthentication
+from core.conditional import ConditionalGetMixin, bump_user_version
+from core.fields import SparseFieldsMixin
+from core.idempotency import idempotent
 from core.models import Tag
+from core.renderers import FastJSONRenderer
+from core.streaming import streaming_json_response
+from core.throttling import UserTokenBucketThrottle
 
 from recipe import serializers
+from recipe.filters import TagPrefixFilter
+from recipe.pagination import TagCursorPagination
+from recipe.sync import sync_tags
 
 
-class TagViewSet(viewsets.GenericViewSet,
+class TagViewSet(ConditionalGetMixin,
+                 SparseFieldsMixin,
+                 viewsets.GenericViewSet,
                  mixins.ListModelMixin,
-                 mixins.CreateModelMixin):
+                 mixins.CreateModelMixin,
+                 mixins.DestroyModelMixin):
     """Manage tags in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.alive()
     serializer_class = serializers.TagSerializer
+    pagination_class = TagCursorPagination
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    filter_backends = (TagPrefixFilter,)
+    throttle_classes = (UserTokenBucketThrottle,)
+    throttle_scope = 'tags'
+    sparse_fields = serializers.TAG_FIELDS
 
+    def get_throttles(self):
+        """Only throttle the writes, listing is cheap and cached"""
+        if self.action not in ('create', 'bulk', 'destroy'):
+            return []
+        return super().get_throttles()
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        return self.queryset.filter(
+            user=self.request.user
+        ).order_by('-name', '-id')
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the tags through the (id, name) fast read path, only the
+        columns selected by ?fields= (and the page keys) are fetched
+        """
+        if 'since' in request.query_params:
+            return Response(sync_tags(
+                Tag.objects.filter(user=request.user),
+                request.query_params['since'],
+            ))
+        fields = self.get_sparse_fields() or serializers.TAG_FIELDS
+        queryset = self.filter_queryset(self.get_queryset())
+        # The keyset pagination needs both columns of its sort key
+        self.row_columns = fields + tuple(
+            name for name in ('id', 'name') if name not in fields
+        )
+        page = self.paginate_queryset(queryset.values_list(
+            *self.row_columns
+        ))
+        if page is not None:
+            return self.get_paginated_response(
+                serializers.serialize_tag_rows(page, fields)
+            )
+        rows = queryset.values_list(*fields)
+        limit = self.get_search_limit(request)
+        if limit is not None:
+            rows = rows[:limit]
+        if self.should_stream(request):
+            return streaming_json_response(
+                request,
+                serializers.iter_tag_rows(
+                    rows.iterator(chunk_size=settings.TAG_STREAM_CHUNK_SIZE),
+                    fields,
+                ),
+                request.accepted_renderer,
+                chunk_size=settings.TAG_STREAM_CHUNK_SIZE,
+                gzip=settings.TAG_STREAM_GZIP,
+            )
+        return Response(serializers.serialize_tag_rows(rows, fields))
+
+    def should_stream(self, request):
+        """
+        Stream unpaginated JSON lists when ?stream= or TAG_LIST_STREAMING
+        asks for it, the browsable API always gets a regular response
+        """
+        if not isinstance(request.accepted_renderer, FastJSONRenderer):
+            return False
+        stream = request.query_params.get('stream')
+        if stream is None:
+            return settings.TAG_LIST_STREAMING
+        return stream in ('1', 'true')
+
+    def get_search_limit(self, request):
+        """Return how many matches a ?prefix= search returns, if any"""
+        if TagPrefixFilter().get_prefix(request) is None:
+            return None
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            return settings.TAG_SEARCH_DEFAULT_LIMIT
+        return max(1, min(limit, settings.TAG_SEARCH_MAX_LIMIT))
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """
+        Create a tag, or return the existing one of the same name
+        with 200 instead of 201
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tag, created = Tag.objects.upsert(request.user,
+                                          serializer.validated_data['name'])
+        if created:
+            bump_user_version(request.user.pk)
+        return Response(
+            self.get_output_serializer(tag).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def perform_destroy(self, instance):
+        """Keep a tombstone for the clients syncing with ?since="""
+        if Tag.objects.filter(pk=instance.pk).soft_delete():
+            bump_user_version(self.request.user.pk)
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        """
+        Create every tag of a JSON array in batched upserts, the ids of
+        existing tags are returned for names already taken.
+        With ?partial=true invalid items are reported and the valid ones
+        are still created, otherwise any invalid item rejects the request.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError(_('Expected a list of tags'))
+        if len(request.data) > settings.TAG_BULK_CREATE_MAX_ITEMS:
+            raise ValidationError(
+                _('At most %d tags can be created at once')
+                % settings.TAG_BULK_CREATE_MAX_ITEMS
+            )
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        errors = {}
+        if serializer.is_valid():
+            validated = serializer.validated_data
+        elif request.query_params.get('partial') in ('1', 'true'):
+            errors = {i: error for i, error in enumerate(serializer.errors)
+                      if error}
+            validated = [serializer.child.run_validation(item)
+                         for i, item in enumerate(request.data)
+                         if i not in errors]
+        else:
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ids = self.bulk_upsert([data['name'] for data in validated])
+        return Response(OrderedDict([
+            ('ids', ids),
+            ('errors', errors),
+        ]), status=status.HTTP_201_CREATED)
 
-    def perform_create(self, serializer):
-        """Create new Tag"""
-        serializer.save(user=self.request.user)
\ No newline at end of file
+    def bulk_upsert(self, names):
+        """Upsert the tags once per name, return their ids in order"""
+        unique = list(OrderedDict.fromkeys(names))
+        results = dict(zip(unique, Tag.objects.bulk_upsert(
+            self.request.user, unique,
+            batch_size=settings.TAG_BULK_CREATE_BATCH_SIZE
+        )))
+        if any(created for _, created in results.values()):
+            bump_user_version(self.request.user.pk)
+        return [results[name][0] for name in names]
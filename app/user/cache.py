@@ -0,0 +1,48 @@
+"""
+Per-user cache of the GET /me/ representation, filled on read and
+rewritten or dropped on every write going through the API or the admin.
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core.cache import build_store
+from core.metrics import REGISTRY
+
+LOOKUPS = REGISTRY.counter(
+    'user_me_cache_lookups_total', 'Lookups of the cached /me/ responses',
+    ('result',)
+)
+
+_store = None
+
+
+def get_me_store():
+    """Return the store holding the representations by user id"""
+    global _store
+    if _store is None:
+        _store = build_store(settings.USER_ME_CACHE, key_prefix='me:')
+    return _store
+
+
+@receiver(setting_changed)
+def reset_me_store(**kwargs):
+    global _store
+    if kwargs['setting'] == 'USER_ME_CACHE':
+        _store = None
+
+
+def get_cached_me(user_id):
+    """Return the cached representation of the user or None"""
+    data = get_me_store().get(user_id)
+    LOOKUPS.inc(('miss',) if data is None else ('hit',))
+    return data
+
+
+def cache_me(user_id, data):
+    get_me_store().set(user_id, dict(data))
+
+
+def invalidate_me(user_ids):
+    """Forget the representations of the users"""
+    get_me_store().delete_many(list(user_ids))
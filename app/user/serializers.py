@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from user.cache import cache_me, invalidate_me
+
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -24,6 +27,11 @@ class UserSerializer(serializers.ModelSerializer):
         if password:
             user.set_password(password)
             user.save()
+        # Write-through, the next GET /me/ needs no serialization. Until
+        # the transaction commits other requests must not see the update
+        data = self.to_representation(user)
+        invalidate_me([user.pk])
+        transaction.on_commit(lambda: cache_me(user.pk, data))
         return user
 
 
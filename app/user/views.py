@@ -1,7 +1,19 @@
-from rest_framework import generics, authentication, permissions
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from rest_framework import generics, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from core.conditional import ConditionalGetMixin
+from core.deletion import request_user_deletion
+from core.fields import SparseFieldsMixin
+from core.throttling import IPTokenBucketThrottle, \
+    LoginTokenBucketThrottle, UserTokenBucketThrottle
+
+from user.cache import cache_me, get_cached_me
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
@@ -10,19 +22,66 @@ class CreateUserView(generics.CreateAPIView):
     Create a new user in the system
     """
     serializer_class = UserSerializer
+    throttle_classes = (IPTokenBucketThrottle,)
+    throttle_scope = 'create-user'
+
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (IPTokenBucketThrottle, LoginTokenBucketThrottle)
+    throttle_scope = 'token'
+
+    def post(self, request, *args, **kwargs):
+        """
+        Return the token of the user, recording the login when
+        LAST_LOGIN_BUFFER batches the last_login writes
+        """
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        if settings.LAST_LOGIN_BUFFER.get('ENABLED'):
+            user_logged_in.send(sender=user.__class__, request=request,
+                                user=user)
+        return Response({'token': token.key})
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ConditionalGetMixin,
+                     SparseFieldsMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (UserTokenBucketThrottle,)
+    throttle_scope = 'me'
+    sparse_fields = ('email', 'name')
 
     def get_object(self):
         """Retrieve and return authentication user"""
         return self.request.user
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return the cached representation, serializing it on a miss. The
+        full representation is cached, ?fields= trims the cached copy
+        """
+        data = get_cached_me(request.user.pk)
+        if data is None:
+            # request.user was read from the primary, never a replica
+            data = self.get_serializer(self.get_object()).data
+            cache_me(request.user.pk, data)
+        return Response(self.filter_representation(data))
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response.data = self.filter_representation(response.data)
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the account now and delete its data in background"""
+        request_user_deletion(self.get_object())
+        return Response(status=status.HTTP_202_ACCEPTED)